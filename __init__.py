@@ -9,7 +9,8 @@ import webbrowser
 import tempfile
 import datetime
 import time
-import html as html_lib
+import threading
+import functools
 from operator import itemgetter
 from collections import defaultdict
 from aqt import mw, gui_hooks, dialogs
@@ -21,10 +22,16 @@ import base64
 # Importa o módulo local de HTML e os arquivos de idioma
 from . import html as report_html
 from . import portugues, ingles
+from . import sidecar
+from . import history
+from . import vector
+from .lru import BoundedCache, approx_size
 
 ADDON_DIR = os.path.dirname(__file__)
 ADDON_FOLDER_NAME = os.path.basename(ADDON_DIR)
 CONFIG_FILE = os.path.join(ADDON_DIR, "pinned_config.json")
+# Pasta preservada pelo Anki ao atualizar o add-on
+USER_FILES_DIR = os.path.join(ADDON_DIR, "user_files")
 
 # Lista padrão de ordem das colunas
 DEFAULT_COL_ORDER = [
@@ -33,7 +40,13 @@ DEFAULT_COL_ORDER = [
     "show_tomorrow", "show_total", "show_streak_count", "show_streak_pct"
 ]
 
+# Versão do formato do pinned_config.json. Ao adicionar chaves em DEFAULT_CONFIG, colunas
+# em DEFAULT_COL_ORDER ou um passo em CONFIG_MIGRATIONS, suba este número: a migração
+# roda uma vez na próxima leitura e o arquivo é regravado já na versão nova.
+CONFIG_VERSION = 1
+
 DEFAULT_CONFIG = {
+    "config_version": CONFIG_VERSION,
     "pinned_ids": [],
     "expanded_ids": [],
     "child_sort_order": {},
@@ -53,7 +66,8 @@ DEFAULT_CONFIG = {
     "chart_days": 7,
     "show_charts": True,
     "language": "pt",
-    "stats_history": {}, 
+    "use_sidecar": True,
+    "background_stats": False,
     
     # --- CONFIGURAÇÃO DE VISIBILIDADE PADRÃO ---
     "show_progress": True,
@@ -75,8 +89,48 @@ DEFAULT_CONFIG = {
     "last_sort_desc": True
 }
 
-STATS_CACHE = {}
-RPG_CACHE = {}
+# Limites aproximados (bytes) dos caches que crescem ao longo da sessão: cada troca de
+# dia, meta ou limiar deixa entradas velhas para trás. Números escalares de um lado,
+# séries de gráfico, cids maduros, cartões por baralho e revisões do RPG de outro.
+CACHE_LIMIT_SCALAR = 4 * 1024 * 1024
+CACHE_LIMIT_HEAVY = 32 * 1024 * 1024
+STATS_CACHE = BoundedCache("stats", CACHE_LIMIT_SCALAR)
+CHART_CACHE = BoundedCache("charts", CACHE_LIMIT_HEAVY)
+# Dados do gráfico global da última renderização; as séries só são montadas no hover
+GLOBAL_CHART = {}
+CARDS_CACHE = BoundedCache("cards", CACHE_LIMIT_HEAVY)
+SUMMARY_CACHE = BoundedCache("summary", CACHE_LIMIT_SCALAR)
+RPG_CACHE = BoundedCache("rpg", CACHE_LIMIT_HEAVY)
+STARS_CACHE = BoundedCache("stars", CACHE_LIMIT_SCALAR)
+# Linhas de hoje do cubo por baralho e o cabeçalho: atualizados no lugar a cada resposta
+# (apply_review_delta) em vez de consultados de novo. Chaveados pelo corte do dia,
+# trim_caches descarta os de dias anteriores.
+TODAY_CACHE = {}
+HEADER_CACHE = {}
+# Baralhos invalidados por revisões, refeitos sob demanda sem descartar os demais
+CARDS_STALE = {}
+RPG_STALE = set()
+MATURE_CACHE = BoundedCache("mature", CACHE_LIMIT_HEAVY)
+BOUNDED_CACHES = (STATS_CACHE, CHART_CACHE, MATURE_CACHE, RPG_CACHE, CARDS_CACHE, SUMMARY_CACHE, STARS_CACHE)
+SIDECAR_SYNCED = False
+CACHE_GENERATION = 0
+STATS_JOB_RUNNING = False
+STATS_DIRTY = False
+LAST_JOB_SIGNATURE = None
+HISTORY_OPEN_LOCK = threading.Lock()
+# Impressão digital da coleção antes da sincronização em andamento
+SYNC_FINGERPRINT = None
+RENDER_SEQ = 0
+# Linhas enviadas por vez durante o cálculo em segundo plano
+STREAM_CHUNK = 8
+# Na renderização em segundo plano guarda o que faltou no cache (só na thread principal)
+_RENDER = threading.local()
+# Configuração lida uma vez e mantida em memória; as alterações são gravadas no
+# arquivo de uma vez, CONFIG_FLUSH_DELAY_MS depois da última (ou ao fechar o perfil)
+CONFIG = None
+CONFIG_DIRTY = False
+CONFIG_TIMER = None
+CONFIG_FLUSH_DELAY_MS = 1500
 LANG = {}
 SELECTED_FOR_STUDY = set()
 TEMP_DECK_NAME = "Estudo Personalizado (Temporário)"
@@ -91,36 +145,91 @@ def load_language():
         LANG = portugues.t
 
 def load_config():
+    """Configuração em memória. Quem altera deve chamar save_config para que seja gravada."""
+    global CONFIG
+    if CONFIG is None:
+        conf, changed = read_config_file()
+        CONFIG = conf
+        if changed: save_config(conf)
+    return CONFIG
+
+def read_config_file():
+    """Lê o arquivo e devolve (config, se precisa ser regravada: novo ou migrado)."""
     if not os.path.exists(CONFIG_FILE):
-        save_config(DEFAULT_CONFIG)
-        return DEFAULT_CONFIG.copy()
+        return json.loads(json.dumps(DEFAULT_CONFIG)), True
     try:
         with open(CONFIG_FILE, "r", encoding="utf-8") as f:
             conf = json.load(f)
-        
-        for k, v in DEFAULT_CONFIG.items():
-            if k not in conf:
-                conf[k] = v
-        
-        current_order = conf.get("column_order", [])
-        if "show_streak" in current_order:
-            idx = current_order.index("show_streak")
-            current_order.pop(idx)
-            if "show_streak_count" not in current_order: current_order.insert(idx, "show_streak_count")
-            if "show_streak_pct" not in current_order: current_order.insert(idx+1, "show_streak_pct")
-            
-        missing = [c for c in DEFAULT_COL_ORDER if c not in current_order]
-        if missing:
-            conf["column_order"] = current_order + missing
-            
-        return conf
+        if conf.get("config_version", 0) >= CONFIG_VERSION:
+            return conf, False
+        migrate_config(conf)
+        return conf, True
     except:
-        return DEFAULT_CONFIG.copy()
+        return json.loads(json.dumps(DEFAULT_CONFIG)), False
+
+def _migrate_split_streak_column(conf):
+    """v1: a coluna "show_streak" virou "show_streak_count" e "show_streak_pct"."""
+    current_order = conf.get("column_order", [])
+    if "show_streak" in current_order:
+        idx = current_order.index("show_streak")
+        current_order.pop(idx)
+        if "show_streak_count" not in current_order: current_order.insert(idx, "show_streak_count")
+        if "show_streak_pct" not in current_order: current_order.insert(idx+1, "show_streak_pct")
+
+# Versão -> passo que leva a config da versão anterior até ela
+CONFIG_MIGRATIONS = {
+    1: _migrate_split_streak_column,
+}
+
+def migrate_config(conf):
+    """Aplica os passos pendentes e completa chaves e colunas novas; roda uma vez por versão."""
+    for version in range(conf.get("config_version", 0) + 1, CONFIG_VERSION + 1):
+        if version in CONFIG_MIGRATIONS:
+            CONFIG_MIGRATIONS[version](conf)
+
+    for k, v in DEFAULT_CONFIG.items():
+        if k not in conf:
+            conf[k] = json.loads(json.dumps(v))
+
+    current_order = conf.get("column_order", [])
+    missing = [c for c in DEFAULT_COL_ORDER if c not in current_order]
+    if missing:
+        conf["column_order"] = current_order + missing
+    conf["config_version"] = CONFIG_VERSION
 
 def save_config(data):
+    """Marca a configuração como alterada; o arquivo é gravado depois, por flush_config."""
+    global CONFIG, CONFIG_DIRTY
+    CONFIG = data
+    CONFIG_DIRTY = True
+    if threading.current_thread() is threading.main_thread():
+        schedule_config_flush()
+    else:
+        mw.taskman.run_on_main(schedule_config_flush)
+
+def schedule_config_flush():
+    """(Re)inicia a espera: várias alterações seguidas resultam numa única gravação."""
+    global CONFIG_TIMER
+    if CONFIG_TIMER is None:
+        CONFIG_TIMER = QTimer(mw)
+        CONFIG_TIMER.setSingleShot(True)
+        CONFIG_TIMER.timeout.connect(flush_config)
+    CONFIG_TIMER.start(CONFIG_FLUSH_DELAY_MS)
+
+def flush_config(force=False):
+    global CONFIG_DIRTY
+    if not CONFIG_DIRTY: return
+    if STATS_JOB_RUNNING and not force:
+        # O cálculo em segundo plano ainda pode alterar o stats_history
+        schedule_config_flush()
+        return
     try:
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        # Arquivo temporário + os.replace: nunca fica um pinned_config.json pela metade
+        tmp_path = CONFIG_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(CONFIG, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, CONFIG_FILE)
+        CONFIG_DIRTY = False
     except Exception as e:
         print("Erro ao salvar config:", e)
 
@@ -131,9 +240,114 @@ def toggle_setting(key):
     mw.deckBrowser.refresh()
 
 def clear_stats_cache():
-    global STATS_CACHE, RPG_CACHE
-    STATS_CACHE = {}
-    RPG_CACHE = {}
+    global SIDECAR_SYNCED, CACHE_GENERATION, STATS_DIRTY
+    if STATS_JOB_RUNNING:
+        # O cálculo em segundo plano ainda grava nestes caches; a limpeza fica para quando ele terminar
+        STATS_DIRTY = True
+        return
+    CACHE_GENERATION += 1
+    for cache in BOUNDED_CACHES: cache.clear()
+    TODAY_CACHE.clear()
+    HEADER_CACHE.clear()
+    CARDS_STALE.clear()
+    RPG_STALE.clear()
+    SIDECAR_SYNCED = False
+
+def trim_caches():
+    """Descarta o excesso dos caches limitados; só entre renderizações e fora do cálculo em segundo plano."""
+    if STATS_JOB_RUNNING: return
+    for cache in BOUNDED_CACHES: cache.trim()
+    cutoff = mw.col.sched.day_cutoff
+    for key in [k for k in TODAY_CACHE if k[0] != cutoff]: del TODAY_CACHE[key]
+    for key in [k for k in HEADER_CACHE if k != cutoff]: del HEADER_CACHE[key]
+    for key in [k for k in CARDS_STALE if k not in CARDS_CACHE]: del CARDS_STALE[key]
+
+def get_cache_stats():
+    """Entradas, bytes, acertos, faltas e descartes de cada cache limitado, para ajustar os limites."""
+    return [cache.stats() for cache in BOUNDED_CACHES]
+
+def invalidate_decks(changed_dids):
+    """
+    Descarta só o que depende dos baralhos alterados: as entradas dos próprios
+    baralhos e dos ancestrais (cuja subárvore os contém). O resto do cache sobrevive.
+    """
+    global SIDECAR_SYNCED, CACHE_GENERATION, STATS_DIRTY
+    if STATS_JOB_RUNNING:
+        STATS_DIRTY = True
+        return
+    changed = set(changed_dids)
+    affected = set(changed)
+    for did in changed:
+        affected.update(p["id"] for p in mw.col.decks.parents(did))
+
+    CACHE_GENERATION += 1
+    for key in [k for k in STATS_CACHE if k[0] in affected]: del STATS_CACHE[key]
+    for key in [k for k in CHART_CACHE if k[0][0] in affected]: del CHART_CACHE[key]
+    for key in [k for k in MATURE_CACHE if k[0] in affected]: del MATURE_CACHE[key]
+    for key in [k for k in SUMMARY_CACHE if not changed.isdisjoint(k[2])]: del SUMMARY_CACHE[key]
+    for key in CARDS_CACHE:
+        CARDS_STALE.setdefault(key, set()).update(changed)
+    SIDECAR_SYNCED = False
+
+def apply_review_delta(cid):
+    """
+    Soma a revisão recém-respondida às linhas de hoje do cubo, ao XP/HP do baralho
+    (refeito em Python a partir das revisões de hoje guardadas) e ao cabeçalho, em vez
+    de consultá-los de novo. Os dados vêm de uma busca pelo cid, no índice do revlog.
+    """
+    rows = mw.col.db.all("""
+        SELECT r.id, r.time, r.type, r.ease, r.factor,
+            c.factor, c.lapses, c.ivl, c.reps, c.did,
+            (SELECT count() FROM revlog WHERE cid = ?1)
+        FROM revlog r JOIN cards c ON c.id = r.cid
+        WHERE r.cid = ?1
+        ORDER BY r.id DESC LIMIT 2
+    """, cid)
+    if not rows: return
+    rid, time_ms, rev_type, ease, rev_factor, factor, lapses, ivl, reps, did, rep_count = rows[0]
+    prev_time = rows[1][1] if len(rows) > 1 else 0
+    cutoff = mw.col.sched.day_cutoff
+    if rid <= (cutoff - 86400) * 1000: return
+
+    for (key_cutoff, streak_thr), (loaded, today_rows) in TODAY_CACHE.items():
+        if key_cutoff != cutoff or did not in loaded: continue
+        row = today_rows.setdefault(did, [did, get_today_day()] + [0] * 12 + [None])
+        row[1 + ease] += 1
+        row[6] += 1
+        if rev_type in (0, 2, 1): row[{0: 7, 2: 8, 1: 9}[rev_type]] += 1
+        row[10] += time_ms
+        if ease > 0: row[11] += rev_factor
+        if rev_type == 1 and rep_count >= streak_thr:
+            row[12] += 1
+            if ease > 1: row[13] += 1
+        row[14] = None
+
+    ancestors = [p["id"] for p in mw.col.decks.parents(did)]
+    for (key_cutoff, leech_thr, tag), cached in list(RPG_CACHE.items()):
+        if key_cutoff != cutoff: continue
+        if cached["reviews"] is None:
+            # Árvore lida do disco, sem as revisões de hoje: recalculada na próxima renderização
+            del RPG_CACHE[(key_cutoff, leech_thr, tag)]
+            continue
+        # O XP usa o estado atual do cartão em todas as revisões dele
+        deck_reviews = [r if r[1] != cid else r[:4] + (factor, lapses, ivl, reps) + r[8:] for r in cached["reviews"].get(did, [])]
+        new_review = (rid, cid, ease, time_ms, factor, lapses, ivl, reps, prev_time)
+        deck_reviews.append(new_review)
+        cached["reviews"][did] = deck_reviews
+        cached["own"][did] = _own_rpg(deck_reviews, leech_thr)
+        for d in [did] + ancestors: cached["tree"].pop(d, None)
+        for d in [did] + ancestors: _resolve_rpg(d, cached["own"], cached["children"], cached["tree"])
+        # Só a revisão nova muda o tamanho da entrada; XP/HP trocam valores do mesmo tamanho
+        RPG_CACHE.resize((key_cutoff, leech_thr, tag), approx_size(new_review))
+
+    header = HEADER_CACHE.get(cutoff)
+    if header:
+        if not header[2]:
+            # Primeira revisão do dia: os dias seguidos mudam, o cabeçalho é refeito
+            del HEADER_CACHE[cutoff]
+        else:
+            if ease in header[0]: header[0][ease] += 1
+            header[1] = max(header[1], rid)
 
 def image_to_base64(filename):
     filepath = os.path.join(ADDON_DIR, filename)
@@ -164,39 +378,55 @@ def get_recursive_time_seconds(node):
         children_seconds += get_recursive_time_seconds(child)
     return max(my_seconds, children_seconds)
 
-def get_daily_stats():
-    start_timestamp = (mw.col.sched.day_cutoff - 86400) * 1000
-    rows = mw.col.db.all(f"""
-        SELECT ease, count()
-        FROM revlog
-        WHERE id > {start_timestamp}
-        GROUP BY ease
-    """)
-    stats = {1: 0, 2: 0, 3: 0, 4: 0}
-    for ease, count in rows:
-        if ease in stats:
-            stats[ease] = count
-    return stats
-
-def get_last_review_time():
-    try:
-        last_ms = mw.col.db.scalar("SELECT id FROM revlog ORDER BY id DESC LIMIT 1")
-        if last_ms:
-            dt = datetime.datetime.fromtimestamp(last_ms / 1000.0)
-            return dt.strftime("%H:%M:%S")
-    except:
-        pass
-    return "--:--:--"
+def get_header_stats():
+    """
+    Respostas de hoje por botão, horário da última revisão e dias seguidos,
+    a partir de uma única consulta sobre o revlog de hoje.
+    """
+    cutoff = mw.col.sched.day_cutoff
+    if cutoff not in HEADER_CACHE:
+        # A sequência global sincroniza o sidecar: numa renderização adiada fica para o segundo plano
+        if deferred_miss("header", cutoff): return {1: "…", 2: "…", 3: "…", 4: "…"}, "…", "…"
+        start_timestamp = (cutoff - 86400) * 1000
+        rows = mw.col.db.all(f"""
+            SELECT ease, count(), max(id)
+            FROM revlog
+            WHERE id > {start_timestamp}
+            GROUP BY ease
+        """)
+        stats = {1: 0, 2: 0, 3: 0, 4: 0}
+        last_ms = 0
+        for ease, count, max_id in rows:
+            if ease in stats:
+                stats[ease] = count
+            last_ms = max(last_ms, max_id)
+        try:
+            if not last_ms:
+                last_ms = mw.col.db.scalar("SELECT id FROM revlog ORDER BY id DESC LIMIT 1") or 0
+        except:
+            pass
+        HEADER_CACHE[cutoff] = [stats, last_ms, bool(rows), get_global_streak(bool(rows))]
+    stats, last_ms, _, global_streak = HEADER_CACHE[cutoff]
 
-def get_global_streak():
+    last_review_time = "--:--:--"
+    if last_ms:
+        dt = datetime.datetime.fromtimestamp(last_ms / 1000.0)
+        last_review_time = dt.strftime("%H:%M:%S")
+    return dict(stats), last_review_time, global_streak
+
+def get_global_streak(reviewed_today):
+    try:
+        store = get_sidecar()
+        if store: return store.global_streak(mw.col.sched.day_cutoff, reviewed_today)
+    except Exception as e:
+        print(f"Pinned Decks: sidecar indisponível, usando o revlog: {e}")
     try:
         cutoff = mw.col.sched.day_cutoff
         query = f"""
             SELECT DISTINCT cast((id/1000 - {cutoff}) / 86400 as int) as day_num
             FROM revlog
-            ORDER BY day_num DESC
         """
-        days = mw.col.db.list(query)
+        days = set(mw.col.db.list(query))
         if not days: return 0
         streak = 0
         current_check = 0 
@@ -210,17 +440,23 @@ def get_global_streak():
     except:
         return 0
 
-def get_historical_stars(ids_str, goal):
-    if goal <= 0 or not ids_str: return 0
+def get_historical_stars(dids, goal, before_today=False):
+    if goal <= 0 or not dids: return 0
+    try:
+        store = get_sidecar()
+        if store: return store.goal_stars(dids, goal, get_today_day() if before_today else None)
+    except Exception as e:
+        print(f"Pinned Decks: sidecar indisponível, usando o revlog: {e}")
     cutoff = mw.col.sched.day_cutoff
+    day_filter = f"AND id <= {(cutoff - 86400) * 1000}" if before_today else ""
     query = f"""
         SELECT count() 
         FROM revlog 
-        WHERE cid IN (SELECT id FROM cards WHERE did IN ({ids_str}))
-        GROUP BY cast((id / 1000 - {cutoff}) / 86400 as int)
+        WHERE cid IN (SELECT id FROM cards WHERE did IN {sidecar.IN_DECK_SET}) {day_filter}
+        GROUP BY cast((id / 1000 - ?) / 86400 as int)
     """
     try:
-        day_counts = mw.col.db.list(query)
+        day_counts = mw.col.db.list(query, sidecar.deck_set_arg(dids), cutoff)
         total_stars = sum(count // goal for count in day_counts)
         return total_stars
     except:
@@ -241,10 +477,164 @@ def get_rpg_icon(mature_count, total_cards):
     elif pct <= 90: return "💎", f"{LANG.get('rpg_icon_level_8', 'Mestre')} ({int(pct)}%)"
     else: return "👑", f"{LANG.get('rpg_icon_level_9', 'Lenda')} ({int(pct)}%)"
 
+# ==================== MOTOR DE STREAK ====================
+
+def get_visible_dids(tree, pinned, cfg):
+    """Decks que aparecem na renderização: os fixados e os filhos expandidos."""
+    expanded = set(cfg.get("expanded_ids", []))
+    visible = []
+
+    def walk(node):
+        visible.append(node.deck_id)
+        if node.deck_id in expanded:
+            for child in node.children:
+                walk(child)
+
+    for did in pinned:
+        node = find_node(tree, did)
+        if node: walk(node)
+    return visible
+
+def get_profile_slug():
+    return re.sub(r"[^\w-]", "_", mw.pm.name or "default")
+
+def get_sidecar():
+    """
+    Banco auxiliar do perfil atual, sincronizado com o revlog uma vez a cada limpeza do cache.
+    Com "use_sidecar" desligado devolve None e quem chama usa a consulta direta à coleção;
+    erros de verdade (banco corrompido, disco) continuam levantando exceção.
+    """
+    global SIDECAR_SYNCED
+    if not load_config().get("use_sidecar", True):
+        sidecar.close()
+        return None
+    profile = get_profile_slug()
+    path = os.path.join(USER_FILES_DIR, f"stats_{profile}.db")
+    if sidecar.current_path() != path:
+        os.makedirs(USER_FILES_DIR, exist_ok=True)
+        sidecar.migrate(os.path.join(ADDON_DIR, f"stats_{profile}.db"), path)
+        sidecar.open_db(path)
+        sidecar.verify(mw.col.db, mw.col.sched.day_cutoff)
+        SIDECAR_SYNCED = False
+    if not SIDECAR_SYNCED:
+        sidecar.sync(mw.col.db, mw.col.sched.day_cutoff)
+        SIDECAR_SYNCED = True
+    return sidecar
+
+def get_history_store():
+    """
+    Histórico diário de ease/retenção do perfil atual. Na primeira abertura traz o
+    antigo "stats_history" da config para o banco e o tira da config.
+    """
+    path = os.path.join(USER_FILES_DIR, f"history_{get_profile_slug()}.db")
+    # O cálculo em segundo plano também grava aqui: abertura e importação numa vez só
+    with HISTORY_OPEN_LOCK:
+        if history.current_path() != path:
+            os.makedirs(USER_FILES_DIR, exist_ok=True)
+            history.open_db(path)
+            cfg = load_config()
+            old_history = cfg.pop("stats_history", None)
+            if old_history is not None:
+                history.import_config_history(old_history)
+                save_config(cfg)
+            history.compact(get_today_date().toordinal())
+    return history
+
+def get_today_date():
+    """Data do dia do Anki (virada em day_cutoff), a mesma usada nas chaves do histórico."""
+    return datetime.date.fromtimestamp(mw.col.sched.day_cutoff - 43200)
+
+def _query_mature_cids(dids, streak_threshold):
+    # lapses_after conta os erros a partir da revisão atual (da mais nova para a mais antiga);
+    # as revisões com lapses_after = 0 são as posteriores ao último erro do cartão.
+    return mw.col.db.all("""
+        SELECT cards.id, cards.did
+        FROM cards
+        JOIN (
+            SELECT cid, count() AS streak
+            FROM (
+                SELECT cid, ease,
+                    SUM(CASE WHEN ease = 1 THEN 1 ELSE 0 END) OVER (PARTITION BY cid ORDER BY id DESC) AS lapses_after
+                FROM revlog
+                WHERE cid IN (SELECT id FROM cards WHERE did IN (SELECT value FROM json_each(?1)) AND reps >= ?2)
+            )
+            WHERE lapses_after = 0 AND ease > 1
+            GROUP BY cid
+        ) s ON s.cid = cards.id
+        WHERE s.streak >= ?2
+    """, sidecar.deck_set_arg(dids), streak_threshold)
+
+def prefetch_mature_cids(root_dids, streak_threshold):
+    """
+    Guarda os cartões maduros de cada baralho. O streak de cada cartão vem do
+    índice incremental do sidecar; sem ele, de uma varredura ordenada do revlog.
+    """
+    cutoff = mw.col.sched.day_cutoff
+    pending = [d for d in root_dids if (d, streak_threshold, cutoff) not in MATURE_CACHE]
+    if not pending: return
+
+    subtrees = {d: mw.col.decks.deck_and_child_ids(d) for d in pending}
+    all_dids = set(itertools.chain.from_iterable(subtrees.values()))
+    by_did = defaultdict(list)
+    if all_dids:
+        rows = None
+        try:
+            store = get_sidecar()
+            if store:
+                # Candidatos dos baralhos pedidos, no cards; o streak de cada um, no índice do sidecar
+                candidates = mw.col.db.all(
+                    f"SELECT id, did FROM cards WHERE did IN {sidecar.IN_DECK_SET} AND reps >= ?",
+                    sidecar.deck_set_arg(all_dids), streak_threshold
+                )
+                mature = store.mature_cids([cid for cid, _ in candidates], streak_threshold)
+                rows = [r for r in candidates if r[0] in mature]
+        except Exception as e:
+            print(f"Pinned Decks: sidecar indisponível, usando o revlog: {e}")
+        if rows is None:
+            rows = _query_mature_cids(all_dids, streak_threshold)
+        for cid, did in rows:
+            by_did[did].append(cid)
+
+    for root, dids in subtrees.items():
+        # Guardados já no formato do link "cid:..." da coluna de maduros
+        cids = sorted(itertools.chain.from_iterable(by_did.get(d, []) for d in dids))
+        MATURE_CACHE[(root, streak_threshold, cutoff)] = ",".join(map(str, cids))
+
 # ==================== LÓGICA RPG ====================
 
+def get_xp_review_rows(start_timestamp, dids=None):
+    """
+    Revisões com id acima de start_timestamp, no formato de _calculate_xp_from_reviews
+    (as 9 primeiras colunas) mais o day_offset e o did. O tempo da revisão anterior de cada cartão vem do LAG
+    na mesma consulta, em vez de uma busca por revisão.
+    """
+    cutoff = mw.col.sched.day_cutoff
+    args = [cutoff, start_timestamp]
+    did_filter = ""
+    if dids is not None:
+        did_filter = "AND cards.did IN (SELECT value FROM json_each(?3))"
+        args.append(sidecar.deck_set_arg(dids))
+    return mw.col.db.all(f"""
+        SELECT id, cid, ease, time, factor, lapses, ivl, reps, prev_time, day_offset, did
+        FROM (
+            SELECT
+                revlog.id AS id, revlog.cid AS cid, revlog.ease AS ease, revlog.time AS time,
+                cards.factor AS factor, cards.lapses AS lapses, cards.ivl AS ivl, cards.reps AS reps,
+                coalesce(LAG(revlog.time) OVER (PARTITION BY revlog.cid ORDER BY revlog.id), 0) AS prev_time,
+                cast((revlog.id/1000 - ?1) / 86400 as int) AS day_offset,
+                cards.did AS did
+            FROM revlog 
+            JOIN cards ON revlog.cid = cards.id
+            WHERE revlog.cid IN (SELECT cid FROM revlog WHERE id > ?2) {did_filter}
+        )
+        WHERE id > ?2
+        ORDER BY id ASC
+    """, *args)
+
 def _calculate_xp_from_reviews(reviews, leech_thr):
-    """Helper function to calculate XP from a list of review rows."""
+    """Helper function to calculate XP from a list of review rows (with the previous review time as the last column)."""
+    if vector.AVAILABLE and len(reviews) >= vector.MIN_ROWS:
+        return vector.calculate_xp(vector.columns(reviews), leech_thr)
     xp = 0
     streak = 0
     fail_streak = 0
@@ -252,7 +642,7 @@ def _calculate_xp_from_reviews(reviews, leech_thr):
     
     prev_time_cache = {}
 
-    for rid, cid, ease, time_ms, factor, lapses, ivl, reps in reviews:
+    for rid, cid, ease, time_ms, factor, lapses, ivl, reps, lag_time_ms in reviews:
         if factor >= 2500: base_xp = 1
         else: base_xp = int((2600 - factor) / 50)
 
@@ -273,10 +663,8 @@ def _calculate_xp_from_reviews(reviews, leech_thr):
                     elif streak >= 5: current_xp_gain *= 1.5
             
             if cid not in prev_time_cache:
-                prev_time_ms = mw.col.db.scalar(f"SELECT time FROM revlog WHERE cid = {cid} AND id < {rid} ORDER BY id DESC LIMIT 1")
-                prev_time_cache[cid] = prev_time_ms
-            else:
-                prev_time_ms = prev_time_cache[cid]
+                prev_time_cache[cid] = lag_time_ms
+            prev_time_ms = prev_time_cache[cid]
 
             if prev_time_ms:
                 diff = time_ms - prev_time_ms
@@ -296,61 +684,117 @@ def _calculate_xp_from_reviews(reviews, leech_thr):
 
     return int(xp)
 
-def get_rpg_daily_stats(did):
+def _calculate_hp_from_reviews(reviews):
+    hp = 100
+    fail_streak = 0
+    
+    for rid, cid, ease, time_ms, factor, lapses, ivl, reps, _ in reviews:
+        damage = 15 + int((2600 - factor) / 100)
+        if ease == 1:
+            hp -= damage
+            fail_streak += 1
+            if fail_streak >= 3: hp -= 25
+        else:
+            fail_streak = 0
+            heal = 1
+            if ease >= 3: heal = 2
+            hp = min(100, hp + heal)
+    return max(0, hp)
+
+def get_deck_children_map():
+    """Mapa pai -> filhos diretos de todos os baralhos, montado pelos nomes."""
+    decks = mw.col.decks.all_names_and_ids()
+    ids_by_name = {d.name: d.id for d in decks}
+    children = defaultdict(list)
+    for d in decks:
+        if "::" in d.name:
+            parent_id = ids_by_name.get(d.name.rsplit("::", 1)[0])
+            if parent_id is not None: children[parent_id].append(d.id)
+    return ids_by_name.values(), children
+
+def _vector_groups(rows, *key_columns):
+    """
+    Colunas NumPy das linhas de get_xp_review_rows, convertidas de uma vez e divididas pelas
+    colunas-chave (índices da linha). Só os grupos com MIN_ROWS revisões; os menores ficam no laço.
+    """
+    if not vector.AVAILABLE or len(rows) < vector.MIN_ROWS: return {}
+    cols = vector.columns(rows, 11)
+    groups = vector.group_columns(cols[:9], *(cols[i] for i in key_columns))
+    return {key: group for key, group in groups.items() if group.shape[1] >= vector.MIN_ROWS}
+
+def _own_rpg(reviews, leech_thr):
+    """(HP, XP) de hoje de um baralho, só com as revisões dos próprios cartões."""
+    if vector.AVAILABLE and len(reviews) >= vector.MIN_ROWS:
+        cols = vector.columns(reviews)
+        return vector.calculate_hp(cols), vector.calculate_xp(cols, leech_thr)
+    return _calculate_hp_from_reviews(reviews), _calculate_xp_from_reviews(reviews, leech_thr)
+
+def _resolve_rpg(did, own, children_map, tree_stats):
+    """Valor do baralho somado aos filhos; reaproveita o que já está em tree_stats."""
+    if did in tree_stats: return tree_stats[did]
+    hp, xp = own.get(did, (100, 0))
+    children = children_map.get(did, [])
+    children_xp_sum = 0
+    min_child_hp = 100
+    for child_id in children:
+        c_hp, c_xp, _ = _resolve_rpg(child_id, own, children_map, tree_stats)
+        children_xp_sum += c_xp
+        if c_hp < min_child_hp: min_child_hp = c_hp
+
+    final_hp = hp
+    if did not in own and children: final_hp = min_child_hp
+    result = (final_hp, int(xp + children_xp_sum), final_hp)
+    tree_stats[did] = result
+    return result
+
+def get_rpg_tree_stats():
+    """
+    HP e XP de hoje de todos os baralhos da coleção: uma varredura do revlog de hoje
+    agrupada por cards.did, somada aos pais pelo mapa de filhos. As revisões de hoje
+    ficam no cache para apply_review_delta refazer um baralho sem consultar o revlog.
+    """
     cfg = load_config()
     leech_thr = cfg.get("leech_threshold", 10)
     cutoff = mw.col.sched.day_cutoff
-    cache_key = (did, cutoff, leech_thr, "rpg_time_v5")
-    if cache_key in RPG_CACHE: return RPG_CACHE[cache_key]
+    cache_key = (cutoff, leech_thr, "rpg_tree_v3")
+    cached = RPG_CACHE.get(cache_key)
+    if cached and not RPG_STALE: return cached["tree"]
+    if deferred_miss("rpg", cache_key): return cached["tree"] if cached else {}
+
+    start_timestamp = (cutoff - 86400) * 1000
+    # Vindo do disco (load_disk_cache) só há a árvore pronta, sem as revisões: refaz tudo
+    if cached and cached["reviews"] is not None:
+        # Refaz só o XP/HP próprio dos baralhos que receberam revisões; a soma nos pais é barata
+        stale = set(RPG_STALE)
+        reviews_by_did = {did: rows for did, rows in cached["reviews"].items() if did not in stale}
+        own = {did: v for did, v in cached["own"].items() if did not in stale}
+        rows = get_xp_review_rows(start_timestamp, stale)
+    else:
+        reviews_by_did = {}
+        own = {}
+        rows = get_xp_review_rows(start_timestamp)
+    RPG_STALE.clear()
+    fresh = defaultdict(list)
+    for r in rows:
+        fresh[r[10]].append(tuple(r[:9]))
+    reviews_by_did.update(fresh)
+
+    groups = _vector_groups(rows, 10)
+    for did, deck_rows in fresh.items():
+        cols = groups.get((did,))
+        if cols is not None: own[did] = (vector.calculate_hp(cols), vector.calculate_xp(cols, leech_thr))
+        else: own[did] = _own_rpg(deck_rows, leech_thr)
+
+    all_dids, children_map = get_deck_children_map()
+    tree_stats = {}
+    for did in all_dids:
+        _resolve_rpg(did, own, children_map, tree_stats)
+    RPG_CACHE[cache_key] = {"reviews": reviews_by_did, "own": own, "children": children_map, "tree": tree_stats}
+    return tree_stats
 
+def get_rpg_daily_stats(did):
     try:
-        start_timestamp = (cutoff - 86400) * 1000
-        query = f"""
-            SELECT revlog.id, revlog.cid, revlog.ease, revlog.time, cards.factor, cards.lapses, cards.ivl, cards.reps
-            FROM revlog 
-            JOIN cards ON revlog.cid = cards.id
-            WHERE revlog.id > {start_timestamp} 
-            AND cards.did = {did}
-            ORDER BY revlog.id ASC
-        """
-        rows = mw.col.db.all(query)
-        
-        hp = 100
-        fail_streak = 0
-        
-        for rid, cid, ease, time_ms, factor, lapses, ivl, reps in rows:
-            damage = 15 + int((2600 - factor) / 100)
-            if ease == 1:
-                hp -= damage
-                fail_streak += 1
-                if fail_streak >= 3: hp -= 25
-            else:
-                fail_streak = 0
-                heal = 1
-                if ease >= 3: heal = 2
-                hp = min(100, hp + heal)
-        
-        xp = _calculate_xp_from_reviews(rows, leech_thr)
-        hp = max(0, hp)
-
-        children = mw.col.decks.children(did)
-        children_xp_sum = 0
-        min_child_hp = 100
-        has_children = False
-
-        for name, child_id in children:
-            has_children = True
-            c_hp, c_xp, c_hp_pct = get_rpg_daily_stats(child_id)
-            children_xp_sum += c_xp
-            if c_hp < min_child_hp: min_child_hp = c_hp
-
-        final_xp = int(xp + children_xp_sum)
-        final_hp = hp
-        if not rows and has_children: final_hp = min_child_hp
-        
-        result = (final_hp, final_xp, final_hp)
-        RPG_CACHE[cache_key] = result
-        return result
+        return get_rpg_tree_stats().get(did, (100, 0, 100))
     except Exception as e:
         return (100, 0, 100)
 
@@ -381,37 +825,51 @@ def get_global_rpg_level(total_xp):
     pct_global = total_xp / 4000.0
     return title, color, pct_level, pct_global, xp_progress_in_level, xp_needed_for_level
 
+def fill_cube_xp(rows):
+    """Completa o XP das linhas do cubo que ainda não o têm, guardando o resultado no sidecar."""
+    missing = {(row[0], row[1]) for row in rows if row[-1] is None}
+    if not missing: return rows
+    leech_thr = load_config().get("leech_threshold", 10)
+    today = get_today_day()
+    cutoff = mw.col.sched.day_cutoff
+    start_timestamp = (cutoff + (min(day for _, day in missing) - today - 1) * 86400) * 1000
+    review_rows = get_xp_review_rows(start_timestamp, {did for did, _ in missing})
+    groups = _vector_groups(review_rows, 10, 9)
+    reviews = defaultdict(list)
+    for r in review_rows:
+        key = (r[10], today + r[9])
+        if key in missing and (r[10], r[9]) not in groups: reviews[key].append(r[:9])
+    xp = {}
+    for did, day in missing:
+        cols = groups.get((did, day - today))
+        if cols is not None: xp[(did, day)] = vector.calculate_xp(cols, leech_thr)
+        else: xp[(did, day)] = _calculate_xp_from_reviews(reviews.get((did, day), []), leech_thr)
+    try:
+        # Sem sidecar (desativado), o XP vale só para esta consulta
+        if sidecar.current_path(): sidecar.set_xp([(value, did, day) for (did, day), value in xp.items()])
+    except Exception as e:
+        print(f"Pinned Decks: não foi possível guardar o XP no sidecar: {e}")
+    return [(*row[:-1], xp.get((row[0], row[1]), row[-1])) for row in rows]
+
 def get_global_daily_summary(days, dids=None):
     """Calculates cards reviewed and XP gained for each of the last N days."""
     cfg = load_config()
-    leech_thr = cfg.get("leech_threshold", 10)
     cutoff = mw.col.sched.day_cutoff
-    
-    start_timestamp = (cutoff - (days * 86400)) * 1000
-    
-    did_filter = ""
-    if dids:
-        dids_str = ",".join(map(str, dids))
-        if dids_str:
-            did_filter = f"AND cards.did IN ({dids_str})"
+    today = get_today_day()
+    if not dids:
+        dids = [d.id for d in mw.col.decks.all_names_and_ids()]
+    cache_key = (cutoff, days, frozenset(dids), cfg.get("streak_threshold", 20), cfg.get("leech_threshold", 10))
+    cached = SUMMARY_CACHE.get(cache_key)
+    if cached is not None: return list(cached)
+    if deferred_miss("summary", (days, tuple(sorted(dids)))): return []
 
     try:
-        query = f"""
-            SELECT 
-                revlog.id, revlog.cid, revlog.ease, revlog.time, 
-                cards.factor, cards.lapses, cards.ivl, cards.reps,
-                cast((revlog.id/1000 - {cutoff}) / 86400 as int) as day_offset
-            FROM revlog 
-            JOIN cards ON revlog.cid = cards.id
-            WHERE revlog.id > {start_timestamp} {did_filter}
-            ORDER BY revlog.id ASC
-        """
-        rows = mw.col.db.all(query)
-        
-        reviews_by_day = defaultdict(list)
-        for r in rows:
-            day_offset = r[-1]
-            reviews_by_day[day_offset].append(r[:-1])
+        # O XP do dia é a soma do XP de cada baralho, como no RPG da árvore
+        per_day = defaultdict(lambda: [0, 0])
+        for row in fill_cube_xp(get_day_cube(dids, today - days + 1, cfg.get("streak_threshold", 20))):
+            day, total, xp = row[1], row[6], row[-1]
+            per_day[day][0] += total
+            per_day[day][1] += xp
             
         results = []
         for i in range(days - 1, -1, -1):
@@ -421,14 +879,11 @@ def get_global_daily_summary(days, dids=None):
             date_obj = datetime.datetime.fromtimestamp(ts)
             date_key = date_obj.strftime("%d/%m")
             
-            day_reviews = reviews_by_day.get(day_offset, [])
-            
-            cards_count = len(day_reviews)
-            xp_gained = _calculate_xp_from_reviews(day_reviews, leech_thr) if day_reviews else 0
-            
+            cards_count, xp_gained = per_day.get(today + day_offset, (0, 0))
             results.append((date_key, cards_count, xp_gained))
             
-        return results
+        SUMMARY_CACHE[cache_key] = results
+        return list(results)
     except Exception as e:
         print(f"Error in get_global_daily_summary: {e}")
         return []
@@ -497,347 +952,233 @@ def start_custom_study_session():
 
 # ==================== ESTATÍSTICAS AVANÇADAS E GRÁFICOS ====================
 
-def get_history_data(did, streak_threshold, current_vals, mode='retention'):
+def get_today_day():
+    """Número absoluto do dia de hoje, na mesma contagem do sidecar."""
+    cutoff = mw.col.sched.day_cutoff
+    return sidecar.day_of(cutoff * 1000, cutoff % 86400) - 1
+
+def get_day_cube(dids, first_day, streak_threshold):
+    """
+    Linhas (did, day, again, hard, good, easy, total, new, lrn, rev, time_ms, factor_sum,
+    streak_att, streak_ok, xp) do cubo baralho × dia, de first_day (dia absoluto) até hoje.
+    """
+    if not dids: return []
+    leech_thr = load_config().get("leech_threshold", 10)
+    try:
+        store = get_sidecar()
+        if store: return store.day_cube(list(dids), first_day, streak_threshold, leech_thr)
+    except Exception as e:
+        print(f"Pinned Decks: sidecar indisponível, usando o revlog: {e}")
+    try:
+        cutoff = mw.col.sched.day_cutoff
+        return [(*r, None) for r in sidecar.cube_from_revlog(mw.col.db, cutoff % 86400, streak_threshold, first_day, dids=list(dids))]
+    except Exception as e:
+        print(f"Error in get_day_cube: {e}")
+        return []
+
+def get_today_rows(dids, streak_threshold):
+    """
+    Linha de hoje do cubo de cada baralho, lida do cubo só uma vez por dia;
+    depois disso apply_review_delta a mantém a cada resposta.
+    """
+    key = (mw.col.sched.day_cutoff, streak_threshold)
+    loaded, today_rows = TODAY_CACHE.setdefault(key, (set(), {}))
+    missing = set(dids) - loaded
+    if missing:
+        for did in missing: today_rows.pop(did, None)
+        for row in get_day_cube(missing, get_today_day(), streak_threshold):
+            today_rows[row[0]] = list(row)
+        loaded.update(missing)
+    return today_rows
+
+def get_history_series(did, streak_threshold, current_vals):
+    """
+    Monta todas as séries dos gráficos de um baralho (retention, reviews, ease,
+    streak_qty, streak_pct) a partir do cubo baralho × dia, só na janela do gráfico.
+    """
     cfg = load_config()
-    history = cfg.get("stats_history", {}).get(str(did), {})
     cutoff = mw.col.sched.day_cutoff
+    today = get_today_day()
     
     days_limit = cfg.get("chart_days", 7)
     if days_limit < 3: days_limit = 3 
+
+    last_day = get_today_date().toordinal()
+    try:
+        saved = get_history_store().window(did, last_day - days_limit + 1, last_day)
+    except Exception as e:
+        print(f"Pinned Decks: Error reading stats history: {e}")
+        saved = {}
     
-    sql_data_map = {}
+    # day_offset -> [passed, total, soma do ease, new, lrn, rev, tentativas de streak, acertos de streak]
+    day_stats = defaultdict(lambda: [0, 0, 0, 0, 0, 0, 0, 0])
     try:
         deck_ids = mw.col.decks.deck_and_child_ids(did)
-        if deck_ids:
-            ids_str = ",".join(str(i) for i in deck_ids)
-            
-            query = f"""
-                WITH RankedReviews AS (
-                    SELECT 
-                        id, cid, ease, type,
-                        cast((id/1000 - {cutoff}) / 86400 as int) as day_offset,
-                        ROW_NUMBER() OVER (PARTITION BY cid ORDER BY id) as rep_count
-                    FROM revlog
-                    WHERE cid IN (SELECT id FROM cards WHERE did IN ({ids_str}))
-                )
-                SELECT 
-                    day_offset,
-                    sum(case when ease > 1 then 1 else 0 end) as passed,
-                    count() as total,
-                    avg(case when ease > 0 then (select factor from cards where id = RankedReviews.cid) else 0 end) as avg_ease,
-                    sum(case when type=0 then 1 else 0 end) as cnt_new,
-                    sum(case when type=2 then 1 else 0 end) as cnt_lrn,
-                    sum(case when type=1 then 1 else 0 end) as cnt_rev,
-                    sum(case when rep_count >= {streak_threshold} AND type=1 then 1 else 0 end) as cnt_streak_attempt,
-                    sum(case when rep_count >= {streak_threshold} AND type=1 AND ease > 1 then 1 else 0 end) as cnt_streak_success
-                FROM RankedReviews
-                GROUP BY day_offset
-                ORDER BY day_offset DESC
-                LIMIT {days_limit}
-            """
-            rows = mw.col.db.all(query)
-            for r in rows:
-                ts = cutoff + (r[0] * 86400) - 43200
-                d_str = datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
-                sql_data_map[d_str] = r
+        for _, day, again, hard, good, easy, total, new, lrn, rev, _, factor_sum, streak_att, streak_ok, _ in get_day_cube(deck_ids, today - days_limit + 1, streak_threshold):
+            d = day_stats[day - today]
+            d[0] += hard + good + easy
+            d[1] += total
+            d[2] += factor_sum
+            d[3] += new
+            d[4] += lrn
+            d[5] += rev
+            d[6] += streak_att
+            d[7] += streak_ok
     except: pass
 
-    data_points = []
+    series = {mode: [] for mode in ('retention', 'reviews', 'ease', 'streak_qty', 'streak_pct')}
     for i in range(days_limit - 1, -1, -1):
         target_ts = cutoff - ((i + 1) * 86400) + 43200 
         date_obj = datetime.datetime.fromtimestamp(target_ts)
-        date_key = date_obj.strftime("%Y-%m-%d")
         display_date = date_obj.strftime("%d/%m")
-        
-        val = 0
-        
-        if mode in ['ease', 'retention']:
-            if date_key in history:
-                h = history[date_key]
-                if mode == 'retention': val = h.get('retention', 0)
-                elif mode == 'ease': val = h.get('ease', 0)
-            
-            if val == 0 and date_key in sql_data_map:
-                r = sql_data_map[date_key]
-                if mode == 'retention':
-                    total = r[2]
-                    passed = r[1]
-                    val = round((passed / total * 100)) if total > 0 else 0
-                elif mode == 'ease':
-                    avg_e = r[3]
-                    val = int(avg_e / 10) if avg_e else 0
-            
-            if val == 0:
-                if mode == 'ease': val = current_vals.get('ease', 0)
-                elif mode == 'retention': val = current_vals.get('retention', 0)
-
+        ease, retention = saved.get(date_obj.date().toordinal(), (0, 0))
+        r = day_stats.get(-i)
+        if r:
+            passed, total, factor_sum, cnt_new, cnt_lrn, cnt_rev, streak_attempt, streak_success = r
+            if retention == 0:
+                retention = round((passed / total * 100)) if total > 0 else 0
+            if ease == 0:
+                avg_e = factor_sum / total if total > 0 else 0
+                ease = int(avg_e / 10) if avg_e else 0
+            series['reviews'].append((display_date, (cnt_new, cnt_lrn, cnt_rev)))
+            series['streak_qty'].append((display_date, streak_success))
+            series['streak_pct'].append((display_date, round((streak_success / streak_attempt * 100)) if streak_attempt > 0 else 0))
         else:
-            if date_key in sql_data_map:
-                r = sql_data_map[date_key]
-                if mode == 'reviews':
-                    val = (r[4], r[5], r[6])
-                elif mode == 'streak_qty':
-                    val = r[8]
-                elif mode == 'streak_pct':
-                    streak_attempt = r[7]
-                    streak_success = r[8]
-                    val = round((streak_success / streak_attempt * 100)) if streak_attempt > 0 else 0
-            else:
-                if mode == 'reviews': val = (0,0,0)
-                else: val = 0
+            series['reviews'].append((display_date, (0, 0, 0)))
+            series['streak_qty'].append((display_date, 0))
+            series['streak_pct'].append((display_date, 0))
         
-        data_points.append((display_date, val))
+        if retention == 0: retention = current_vals.get('retention', 0)
+        if ease == 0: ease = current_vals.get('ease', 0)
+        series['retention'].append((display_date, retention))
+        series['ease'].append((display_date, ease))
 
-    return data_points
-
-def generate_svg(data, title, color_line="#4da6ff", chart_type="line"):
-    if not data: return ""
-    
-    calculated_width = (len(data) * 40) + 80
-    width = max(260, calculated_width)
-    
-    height = 180
-    margin_top = 50
-    margin_bottom = 60
-    margin_left = 35
-    margin_right = 35
-    
-    graph_h = height - margin_top - margin_bottom
-    graph_w = width - margin_left - margin_right
-    
-    if chart_type == "grouped_bar":
-        all_vals = []
-        for d, v in data:
-            all_vals.extend(v)
-        max_val = max(all_vals) if all_vals else 10
-        min_val = 0
-    else:
-        vals = [v for d, v in data]
-        max_val = max(vals) if vals else 100
-        min_val = min(vals) if vals else 0
-    
-    if chart_type == "line":
-        display_min = max(0, min_val - 10)
-        display_max = 100
-        if max_val > 100: display_max = max_val * 1.05
-        val_range = display_max - display_min
-        if val_range == 0: val_range = 10
-    else:
-        display_min = 0
-        display_max = max_val * 1.1 
-        val_range = display_max
-        if val_range == 0: val_range = 1
-
-    points = []
-    step_x = graph_w / (len(data) - 1) if len(data) > 1 else graph_w / 2
-    
-    svg_content = []
-    svg_content.append(f'<text x="{width/2}" y="20" font-family="sans-serif" font-size="12" font-weight="bold" fill="#555" text-anchor="middle">{title}</text>')
-    svg_content.append(f'<rect x="{margin_left}" y="{margin_top}" width="{graph_w}" height="{graph_h}" fill="rgba(0,0,0,0.03)" />')
-    
-    for i, item in enumerate(data):
-        date_str = item[0]
-        val = item[1]
-        x = margin_left + (i * step_x) if len(data) > 1 else width/2
-        
-        svg_content.append(f'<line x1="{x}" y1="{margin_top}" x2="{x}" y2="{height-margin_bottom}" stroke="#000" stroke-opacity="0.1" stroke-width="1" />')
-        
-        if chart_type == "grouped_bar":
-            c_new, c_lrn, c_rev = val
-            alloc_width = (graph_w / len(data)) * 0.8
-            group_width = min(alloc_width, 50)
-            bar_width = group_width / 3
-            
-            x_new = x - bar_width
-            x_lrn = x
-            x_rev = x + bar_width
-            
-            h_new = (c_new / val_range) * graph_h
-            h_lrn = (c_lrn / val_range) * graph_h
-            h_rev = (c_rev / val_range) * graph_h
-            
-            y_base = margin_top + graph_h
-            
-            if h_new > 0:
-                svg_content.append(f'<rect x="{x_new - bar_width/2}" y="{y_base - h_new}" width="{bar_width}" height="{h_new}" fill="#4da6ff" opacity="0.9" />')
-                svg_content.append(f'<text x="{x_new}" y="{y_base - h_new - 2}" font-family="sans-serif" font-size="8" fill="#333" text-anchor="middle">{c_new}</text>')
-            
-            if h_lrn > 0:
-                svg_content.append(f'<rect x="{x_lrn - bar_width/2}" y="{y_base - h_lrn}" width="{bar_width}" height="{h_lrn}" fill="#ff5a5a" opacity="0.9" />')
-                svg_content.append(f'<text x="{x_lrn}" y="{y_base - h_lrn - 2}" font-family="sans-serif" font-size="8" fill="#333" text-anchor="middle">{c_lrn}</text>')
-                
-            if h_rev > 0:
-                svg_content.append(f'<rect x="{x_rev - bar_width/2}" y="{y_base - h_rev}" width="{bar_width}" height="{h_rev}" fill="#5aff5a" opacity="0.9" />')
-                svg_content.append(f'<text x="{x_rev}" y="{y_base - h_rev - 2}" font-family="sans-serif" font-size="8" fill="#333" text-anchor="middle">{c_rev}</text>')
-            
-        elif chart_type == "bar":
-            pass
-            
-        else: # Line
-            y = margin_top + graph_h - ((val - display_min) / val_range * graph_h)
-            points.append((x, y))
-            svg_content.append(f'<text x="{x}" y="{y-8}" font-family="sans-serif" font-size="10" fill="#333" text-anchor="middle">{val}</text>')
-
-        svg_content.append(f'''
-            <text transform="translate({x+3}, {height-10}) rotate(-90)" 
-                  font-family="sans-serif" font-size="10" fill="#777" text-anchor="start">
-                {date_str}
-            </text>
-        ''')
-
-    if chart_type == "line" and points:
-        path_d = f"M {points[0][0]} {points[0][1]}"
-        for px, py in points[1:]:
-            path_d += f" L {px} {py}"
-        svg_content.append(f'<path d="{path_d}" fill="none" stroke="{color_line}" stroke-width="2" />')
-        for px, py in points:
-            svg_content.append(f'<circle cx="{px}" cy="{py}" r="3" fill="#fff" stroke="{color_line}" stroke-width="2" />')
-
-    return f'''
-    <svg width="{width}" height="{height}" xmlns="http://www.w3.org/2000/svg" style="background:rgba(255,255,255,0.95); border-radius:4px; box-shadow:0 2px 5px rgba(0,0,0,0.1);">
-        {"".join(svg_content)}
-    </svg>
-    '''
-
-def generate_global_stats_svg(data):
-    if not data: return ""
-    
-    num_days = len(data)
-    bar_group_width = 65
-    width = (num_days * bar_group_width) + 80
-    height = 240
-    # Margens para comportar labels e valores negativos
-    margin = {'top': 60, 'bottom': 80, 'left': 40, 'right': 40}
-    
-    graph_h = height - margin['top'] - margin['bottom']
-    graph_w = width - margin['left'] - margin['right']
-    
-    cards_vals = [d[1] for d in data]
-    xp_vals = [d[2] for d in data]
-    
-    # BUGFIX: Considera valores absolutos para que a escala suporte barras negativas
-    max_cards = max(cards_vals) if cards_vals else 1
-    max_xp = max([abs(x) for x in xp_vals]) if xp_vals else 1
-    
-    max_val = max(max_cards, max_xp)
-    if max_val == 0: max_val = 1
+    return series
 
-    svg_content = []
-    title = LANG.get("daily_summary_chart_title", "Resumo Diário")
-    svg_content.append(f'<text x="{width/2}" y="20" class="svg-title" text-anchor="middle">{title}</text>')
-    
-    # Legenda
-    svg_content.append(f'<rect x="{width/2 - 70}" y="28" width="10" height="10" fill="#4da6ff" />')
-    svg_content.append(f'<text x="{width/2 - 55}" y="37" class="svg-legend">{LANG.get("cards", "Cards")}</text>')
-    svg_content.append(f'<rect x="{width/2 + 20}" y="28" width="10" height="10" fill="#ffd700" />')
-    svg_content.append(f'<text x="{width/2 + 35}" y="37" class="svg-legend">XP</text>')
-
-    step_x = graph_w / num_days
-    bar_width = step_x * 0.35
-    baseline = margin['top'] + graph_h # Linha de base onde as barras "nascem"
-
-    for i, (date_str, cards, xp, level_name) in enumerate(data):
-        x_base = margin['left'] + (i * step_x) + (step_x / 2)
-        
-        # Barra de Cards (sempre positiva)
-        h_cards = (cards / max_val) * graph_h if cards > 0 else 0
-        y_cards = baseline - h_cards
-        svg_content.append(f'<rect x="{x_base - bar_width - 1}" y="{y_cards}" width="{bar_width}" height="{h_cards}" fill="#4da6ff"><title>{LANG.get("cards", "Cards")}: {cards}</title></rect>')
-        if cards > 0:
-            svg_content.append(f'<text x="{x_base - bar_width/2 - 1}" y="{y_cards - 3}" class="svg-bar-label" text-anchor="middle">{cards}</text>')
-
-        # Barra de XP (Suporta valores negativos)
-        h_xp = (abs(xp) / max_val) * graph_h
-        if xp >= 0:
-            y_xp = baseline - h_xp
-            label_y = y_xp - 3
-        else:
-            # Se negativo, a barra começa no baseline e desce
-            y_xp = baseline
-            label_y = baseline + h_xp + 10 # Texto abaixo da barra negativa
-            
-        svg_content.append(f'<rect x="{x_base + 1}" y="{y_xp}" width="{bar_width}" height="{h_xp}" fill="#ffd700"><title>XP: {xp}</title></rect>')
-        if xp != 0:
-            svg_content.append(f'<text x="{x_base + bar_width/2 + 1}" y="{label_y}" class="svg-bar-label" text-anchor="middle">{xp}</text>')
-
-        # Labels do Eixo X
-        label_y_axis = height - margin["bottom"] + 15
-        svg_content.append(f'''
-            <text transform="translate({x_base - 5}, {label_y_axis}) rotate(-60)" 
-                  class="svg-axis-label" text-anchor="end">{date_str}</text>
-        ''')
-        svg_content.append(f'''
-            <text transform="translate({x_base - 5}, {label_y_axis + 15}) rotate(-60)" 
-                  class="svg-level-label" text-anchor="end">{level_name}</text>
-        ''')
-
-    return f'''
-    <div style="max-width: 600px; overflow-x: auto; padding-bottom: 10px; background: rgba(255,255,255,0.95); border-radius: 4px;">
-        <svg width="{width}" height="{height}" xmlns="http://www.w3.org/2000/svg">
-            <style>
-                .svg-title {{ font-family: sans-serif; font-size: 14px; font-weight: bold; fill: #333; }}
-                .svg-legend {{ font-family: sans-serif; font-size: 10px; fill: #555; }}
-                .svg-bar-label {{ font-family: sans-serif; font-size: 9px; fill: #333; }}
-                .svg-axis-label {{ font-family: sans-serif; font-size: 10px; fill: #777; }}
-                .svg-level-label {{ font-family: sans-serif; font-size: 9px; font-weight: bold; fill: #333; }}
-            </style>
-            {"".join(svg_content)}
-        </svg>
-    </div>
-    '''
+EMPTY_DECK_STATS = ("-", "-", 0, 0, 0, "-", "-", 0, 0, "-", 0, 0, 0, {1:0, 2:0, 3:0, 4:0}, "-", "", "", "", "", "", "")
+# Mostrado enquanto o cálculo em segundo plano não termina
+PENDING_DECK_STATS = ("…", "…", 0, 0, 0, "…", "…", 0, 0, "…", 0, 0, 0, {1:0, 2:0, 3:0, 4:0}, "…", "", "", "", "", "", "")
 
-def get_deck_stats_advanced(did, streak_threshold, leech_threshold, deck_goal):
+def get_cards_by_did(leech_threshold):
+    """
+    [total, amanhã, soma do ease, cartões com ease, sanguessugas] de cada baralho da
+    coleção, numa única varredura de cards por renderização. Quem usa soma por subárvore.
+    Numa renderização adiada, sem cache, devolve None (a varredura vai para o segundo plano).
+    """
+    tomorrow_due_date = mw.col.sched.today + 1
+    key = (tomorrow_due_date, leech_threshold)
+    if (key not in CARDS_CACHE or key in CARDS_STALE) and deferred_miss("cards", leech_threshold): return None
+    if key not in CARDS_CACHE:
+        CARDS_CACHE[key] = _query_cards_by_did(tomorrow_due_date, leech_threshold)
+    elif key in CARDS_STALE:
+        # Só os baralhos que receberam revisões desde a varredura
+        stale = CARDS_STALE.pop(key)
+        cards_by_did = CARDS_CACHE.peek(key)
+        for did in stale: cards_by_did.pop(did, None)
+        cards_by_did.update(_query_cards_by_did(tomorrow_due_date, leech_threshold, stale))
+    return CARDS_CACHE[key]
+
+def _query_cards_by_did(tomorrow_due_date, leech_threshold, dids=None):
+    did_filter = ""
+    args = []
+    if dids is not None:
+        did_filter = f"WHERE did IN {sidecar.IN_DECK_SET}"
+        args.append(sidecar.deck_set_arg(dids))
+    return {row[0]: row[1:] for row in mw.col.db.all(f"""
+        SELECT did, count(),
+            sum(case when queue = 2 and due = {tomorrow_due_date} then 1 else 0 end),
+            sum(case when queue != 0 then factor else 0 end),
+            sum(case when queue != 0 then 1 else 0 end),
+            sum(case when lapses >= {leech_threshold} then 1 else 0 end)
+        FROM cards
+        {did_filter}
+        GROUP BY did
+    """, *args)}
+
+def sum_cards_stats(cards_by_did, dids):
+    totals = [0, 0, 0, 0, 0]
+    for d in dids:
+        for i, value in enumerate(cards_by_did.get(d, ())):
+            totals[i] += value
+    return totals
+
+def _stats_cache_key(did, streak_threshold, leech_threshold, deck_goal, cutoff):
+    return (did, streak_threshold, leech_threshold, deck_goal, cutoff, "v_cube")
+
+def prefetch_deck_stats(root_dids, streak_threshold, leech_threshold, deck_goals=None):
+    """
+    Calcula as estatísticas de vários baralhos de uma vez: um número fixo de
+    consultas GROUP BY did sobre cards e revlog, somadas por subárvore em Python.
+    """
     cutoff = mw.col.sched.day_cutoff
     cfg = load_config()
-    chart_days = cfg.get("chart_days", 7)
-    show_charts = cfg.get("show_charts", True)
-    
-    # Cache key atualizada para incluir o novo retorno
-    cache_key = (did, streak_threshold, leech_threshold, deck_goal, cutoff, chart_days, show_charts, "v_cid_fix")
-    if cache_key in STATS_CACHE: return STATS_CACHE[cache_key]
+    if deck_goals is None:
+        deck_goals = {did: cfg.get("deck_goals", {}).get(str(did), 100) for did in root_dids}
+
+    pending = {}
+    for did in root_dids:
+        key = _stats_cache_key(did, streak_threshold, leech_threshold, deck_goals[did], cutoff)
+        # Os cids maduros ficam em MATURE_CACHE, com o limite dos caches pesados
+        if key not in STATS_CACHE or (did, streak_threshold, cutoff) not in MATURE_CACHE: pending[did] = key
+    if not pending: return
 
     try:
-        deck_ids = mw.col.decks.deck_and_child_ids(did)
-        if not deck_ids: 
-            return ("-", "-", 0, 0, 0, "-", "-", 0, 0, "-", 0, 0, 0, {1:0, 2:0, 3:0, 4:0}, "-", "", "", "", "", "", "")
-        ids_str = ",".join(str(i) for i in deck_ids)
+        subtrees = {did: mw.col.decks.deck_and_child_ids(did) for did in pending}
+        all_dids = set(itertools.chain.from_iterable(subtrees.values()))
+        if not all_dids: return
+        prefetch_mature_cids(list(pending), streak_threshold)
+
+        cards_by_did = get_cards_by_did(leech_threshold)
+
+        today_by_did = get_today_rows(all_dids, streak_threshold)
+
+        # Tempo das últimas 100 revisões, só para quem não estudou hoje
+        idle_dids = set()
+        for did, dids in subtrees.items():
+            if not any(d in today_by_did for d in dids):
+                idle_dids.update(dids)
+        history_by_did = defaultdict(list)
+        recent = None
+        try:
+            store = get_sidecar()
+            if store: recent = store.recent_times(idle_dids) if idle_dids else []
+        except Exception as e:
+            print(f"Pinned Decks: sidecar indisponível, usando o revlog: {e}")
+        if recent is None:
+            recent = mw.col.db.all(f"""
+                SELECT did, id, time FROM (
+                    SELECT cards.did AS did, revlog.id AS id, revlog.time AS time,
+                        ROW_NUMBER() OVER (PARTITION BY cards.did ORDER BY revlog.id DESC) AS rn
+                    FROM revlog
+                    JOIN cards ON revlog.cid = cards.id
+                    WHERE cards.did IN {sidecar.IN_DECK_SET}
+                )
+                WHERE rn <= 100
+            """, sidecar.deck_set_arg(idle_dids)) if idle_dids else []
+        for d, rid, t in recent:
+            history_by_did[d].append((rid, t))
+    except Exception as e:
+        print(f"Error in prefetch_deck_stats: {e}")
+        return
 
-        total_cards = mw.col.db.scalar(f"SELECT count() FROM cards WHERE did IN ({ids_str})")
-        
-        # BUSCA DOS IDs DOS CARTÕES COM STREAK (Garante sincronia com o Browser)
-        mature_cids = mw.col.db.list(f"""
-            SELECT c.id FROM cards c
-            WHERE c.did IN ({ids_str})
-            AND c.reps >= {streak_threshold}
-            AND (
-                SELECT count(*)
-                FROM revlog r
-                WHERE r.cid = c.id
-                AND r.id > COALESCE((
-                    SELECT MAX(id)
-                    FROM revlog r2
-                    WHERE r2.cid = c.id AND r2.ease = 1
-                ), 0)
-                AND r.ease > 1
-            ) >= {streak_threshold}
-        """)
-        
-        mature_count_int = len(mature_cids)
-        mature_cids_str = ",".join(map(str, mature_cids))
+    today_ordinal = get_today_date().toordinal()
+    history_rows = []
+    results = {}
+
+    for did in pending:
+        dids = subtrees[did]
+        if not dids: continue
+        deck_goal = deck_goals[did]
+
+        total_cards, tomorrow_count, factor_sum, factor_count, leech_count = sum_cards_stats(cards_by_did, dids)
+
+        mature_cids_str = MATURE_CACHE.peek((did, streak_threshold, cutoff))
+        mature_count_int = mature_cids_str.count(",") + 1 if mature_cids_str else 0
         
         pct_mature = (mature_count_int / total_cards * 100) if total_cards > 0 else 0
         maturity_str = f"{mature_count_int}"
         maturity_pct_str = f"{pct_mature:.0f}%"
 
-        start_timestamp = (cutoff - 86400) * 1000
-        today_reviews = mw.col.db.all(f"""
-            SELECT revlog.ease, revlog.time, cards.reps, revlog.type
-            FROM revlog 
-            JOIN cards ON revlog.cid = cards.id
-            WHERE revlog.id > {start_timestamp} 
-            AND cards.did IN ({ids_str})
-        """)
-        
         retention_str = "-"
         done_today_count = 0
         passed_today_count = 0
@@ -849,18 +1190,19 @@ def get_deck_stats_advanced(did, streak_threshold, leech_threshold, deck_goal):
         current_retention_val = 0
         today_streak_qty = 0
         today_streak_attempts = 0
+
+        for d in dids:
+            if d not in today_by_did: continue
+            _, _, again, hard, good, easy, total, _, _, _, time_ms, _, streak_att, streak_ok, _ = today_by_did[d]
+            done_today_count += total
+            passed_today_count += hard + good + easy
+            total_time_ms += time_ms
+            today_streak_attempts += streak_att
+            today_streak_qty += streak_ok
+            for ease, count in zip((1, 2, 3, 4), (again, hard, good, easy)):
+                ease_counts[ease] += count
         
-        if today_reviews:
-            done_today_count = len(today_reviews)
-            for ease, time, reps, type in today_reviews:
-                if ease > 1: passed_today_count += 1
-                total_time_ms += time
-                if ease in ease_counts: ease_counts[ease] += 1
-                
-                if type == 1 and reps >= streak_threshold:
-                    today_streak_attempts += 1
-                    if ease > 1: today_streak_qty += 1
-            
+        if done_today_count > 0:
             current_retention_val = round(passed_today_count / done_today_count * 100)
             retention_str = f"{current_retention_val}%"
 
@@ -876,13 +1218,8 @@ def get_deck_stats_advanced(did, streak_threshold, leech_threshold, deck_goal):
             avg_sec = (total_time_ms / 1000) / done_today_count
             avg_time_str = f"{avg_sec:.1f}s"
         else:
-            history_times = mw.col.db.list(f"""
-                SELECT revlog.time 
-                FROM revlog 
-                JOIN cards ON revlog.cid = cards.id 
-                WHERE cards.did IN ({ids_str}) 
-                ORDER BY revlog.id DESC LIMIT 100
-            """)
+            recent = itertools.chain.from_iterable(history_by_did.get(d, []) for d in dids)
+            history_times = [t for _, t in sorted(recent, reverse=True)[:100]]
             if history_times:
                 hist_count = len(history_times)
                 hist_total_ms = sum(history_times)
@@ -893,49 +1230,196 @@ def get_deck_stats_advanced(did, streak_threshold, leech_threshold, deck_goal):
                     hist_cpm = hist_count / hist_total_min
                     speed_str = f"{hist_cpm:.1f}"
 
-        tomorrow_due_date = mw.col.sched.today + 1
-        tomorrow_count = mw.col.db.scalar(f"""
-            SELECT count() FROM cards 
-            WHERE did IN ({ids_str}) 
-            AND queue = 2 
-            AND due = {tomorrow_due_date}
-        """)
-
-        avg_ease = mw.col.db.scalar(f"SELECT avg(factor) FROM cards WHERE did IN ({ids_str}) AND queue != 0")
         ease_str = "-"
         current_ease_val = 0
-        if avg_ease:
-            current_ease_val = int(avg_ease / 10)
+        if factor_count and factor_sum:
+            current_ease_val = int(factor_sum / factor_count / 10)
             ease_str = f"{current_ease_val}%"
 
-        leech_count = mw.col.db.scalar(f"SELECT count() FROM cards WHERE did IN ({ids_str}) AND lapses >= {leech_threshold}")
-        total_stars = get_historical_stars(ids_str, deck_goal)
+        # Dias anteriores não mudam ao longo do dia; hoje vem da contagem acima
+        stars_key = (did, deck_goal, cutoff)
+        if stars_key not in STARS_CACHE:
+            STARS_CACHE[stars_key] = get_historical_stars(dids, deck_goal, before_today=True)
+        total_stars = STARS_CACHE[stars_key] + (done_today_count // deck_goal if deck_goal > 0 else 0)
 
-        if "stats_history" not in cfg: cfg["stats_history"] = {}
-        today_key = datetime.datetime.fromtimestamp(cutoff - 43200).strftime('%Y-%m-%d')
-        did_str = str(did)
-        if did_str not in cfg["stats_history"]: cfg["stats_history"][did_str] = {}
-        
-        saved_day = cfg["stats_history"][did_str].get(today_key, {})
-        if saved_day.get("ease") != current_ease_val or saved_day.get("retention") != current_retention_val:
-            cfg["stats_history"][did_str][today_key] = {"ease": current_ease_val, "retention": current_retention_val}
-            save_config(cfg)
-
-        retention_svg = reviews_svg = ease_svg = streak_qty_svg = streak_pct_svg = ""
-        if show_charts:
-            current_vals = {'ease': current_ease_val, 'retention': current_retention_val, 'streak_qty': today_streak_qty, 'streak_pct': today_streak_pct}
-            ret_data = get_history_data(did, streak_threshold, current_vals, 'retention')
-            rev_data = get_history_data(did, streak_threshold, current_vals, 'reviews')
-            ease_data = get_history_data(did, streak_threshold, current_vals, 'ease')
-            retention_svg = generate_svg(ret_data, LANG.get("chart_title_retention", "Retenção"), "#4da6ff", "line")
-            reviews_svg = generate_svg(rev_data, LANG.get("chart_title_reviews", "Revisões"), "", "grouped_bar")
-            ease_svg = generate_svg(ease_data, LANG.get("chart_title_ease", "Ease Médio"), "#FFD700", "line")
-
-        result = (maturity_str, retention_str, total_cards, tomorrow_count, done_today_count, speed_str, ease_str, leech_count, mature_count_int, avg_time_str, total_time_ms, total_stars, passed_today_count, ease_counts, maturity_pct_str, retention_svg, reviews_svg, ease_svg, streak_qty_svg, streak_pct_svg, mature_cids_str)
-        STATS_CACHE[cache_key] = result
-        return result
-    except Exception as e:
-        return ("-", "-", 0, 0, 0, "-", "-", 0, 0, "-", 0, 0, 0, {1:0, 2:0, 3:0, 4:0}, "-", "", "", "", "", "", "")
+        history_rows.append((did, today_ordinal, current_ease_val, current_retention_val))
+
+        current_vals = {'ease': current_ease_val, 'retention': current_retention_val, 'streak_qty': today_streak_qty, 'streak_pct': today_streak_pct}
+        results[pending[did]] = (current_vals, (maturity_str, retention_str, total_cards, tomorrow_count, done_today_count, speed_str, ease_str, leech_count, mature_count_int, avg_time_str, total_time_ms, total_stars, passed_today_count, ease_counts, maturity_pct_str))
+
+    # O histórico de hoje precisa estar salvo antes dos gráficos, que o leem do banco
+    if history_rows:
+        try:
+            get_history_store().record(history_rows)
+        except Exception as e:
+            print(f"Pinned Decks: Error saving stats history: {e}")
+    STATS_CACHE.update(results)
+
+# modo: (chave do título, título padrão, cor, tipo)
+CHART_MODES = {
+    "retention": ("chart_title_retention", "Retenção", "#4da6ff", "line"),
+    "reviews": ("chart_title_reviews", "Revisões", "", "grouped_bar"),
+    "ease": ("chart_title_ease", "Ease Médio", "#FFD700", "line"),
+}
+
+def get_deck_chart_ids(did, cfg):
+    """Identificadores dos gráficos de uma linha; as séries são pedidas pelo hover (get_chart_data)."""
+    if not cfg.get("show_charts", True): return ("", "", "", "", "")
+    return (f"{did}:retention", f"{did}:reviews", f"{did}:ease", "", "")
+
+def get_deck_chart(did, streak_threshold, stats_key, current_vals, cfg, mode):
+    """
+    Série de um gráfico do baralho, no formato que pdDeckSvg (html.CHART_JS) desenha.
+    Fica num cache à parte, por janela de dias, então mudar chart_days ou esconder
+    os gráficos não invalida os números.
+    """
+    chart_key = (stats_key, max(cfg.get("chart_days", 7), 3))
+    series = CHART_CACHE.get(chart_key)
+    if series is None:
+        series = CHART_CACHE[chart_key] = get_history_series(did, streak_threshold, current_vals)
+    data = series[mode]
+    title_key, title, color, chart_type = CHART_MODES[mode]
+    return {
+        "type": chart_type, "title": LANG.get(title_key, title), "color": color,
+        "labels": [date for date, _ in data], "values": [val for _, val in data],
+    }
+
+def get_chart_data(chart_id):
+    """Responde ao pycmd("chart:<id>") do hover com a série do gráfico, que o navegador desenha."""
+    if chart_id == "global":
+        if "data" not in GLOBAL_CHART and "args" in GLOBAL_CHART:
+            chart_days, dids, reviews_today, xp_today = GLOBAL_CHART["args"]
+            global_daily_data = get_global_daily_summary(chart_days, dids=dids)
+            if global_daily_data:
+                global_daily_data[-1] = (global_daily_data[-1][0], reviews_today, xp_today)
+            GLOBAL_CHART["data"] = {
+                "type": "global",
+                "title": LANG.get("daily_summary_chart_title", "Resumo Diário"),
+                "cards_label": LANG.get("cards", "Cards"),
+                "labels": [date for date, _, _ in global_daily_data],
+                "cards": [cards for _, cards, _ in global_daily_data],
+                "xp": [daily_xp for _, _, daily_xp in global_daily_data],
+                "levels": [get_global_rpg_level(daily_xp)[0] for _, _, daily_xp in global_daily_data],
+            }
+        return GLOBAL_CHART.get("data")
+
+    did_str, _, mode = chart_id.partition(":")
+    if mode not in CHART_MODES: return None
+    did = int(did_str)
+    cfg = load_config()
+    streak_threshold = cfg.get("streak_threshold", 20)
+    leech_threshold = cfg.get("leech_threshold", 10)
+    deck_goal = cfg.get("deck_goals", {}).get(str(did), 100)
+    cache_key = _stats_cache_key(did, streak_threshold, leech_threshold, deck_goal, mw.col.sched.day_cutoff)
+    entry = STATS_CACHE.get(cache_key)
+    if entry is None:
+        prefetch_deck_stats([did], streak_threshold, leech_threshold, {did: deck_goal})
+        entry = STATS_CACHE.peek(cache_key)
+    if entry is None: return None
+    return get_deck_chart(did, streak_threshold, cache_key, entry[0], cfg, mode)
+
+def get_deck_stats_advanced(did, streak_threshold, leech_threshold, deck_goal):
+    cutoff = mw.col.sched.day_cutoff
+    cfg = load_config()
+    
+    cache_key = _stats_cache_key(did, streak_threshold, leech_threshold, deck_goal, cutoff)
+    mature_key = (did, streak_threshold, cutoff)
+    entry = STATS_CACHE.get(cache_key)
+    mature_cids_str = MATURE_CACHE.get(mature_key) if entry is not None else None
+    if entry is None or mature_cids_str is None:
+        if deferred_miss("decks", (did, streak_threshold, leech_threshold, deck_goal)): return PENDING_DECK_STATS
+        prefetch_deck_stats([did], streak_threshold, leech_threshold, {did: deck_goal})
+        entry, mature_cids_str = STATS_CACHE.peek(cache_key), MATURE_CACHE.peek(mature_key)
+    if entry is None or mature_cids_str is None: return EMPTY_DECK_STATS
+    return entry[1] + get_deck_chart_ids(did, cfg) + (mature_cids_str,)
+
+# ==================== CÁLCULO EM SEGUNDO PLANO ====================
+
+def deferred_miss(kind, item):
+    """Durante uma renderização adiada, anota o que não estava no cache e devolve True."""
+    missing = getattr(_RENDER, "missing", None)
+    if missing is None: return False
+    missing[kind].add(item)
+    return True
+
+def is_render_deferred():
+    return getattr(_RENDER, "missing", None) is not None
+
+def render_streamed(did, render_fn, *args):
+    """Renderiza uma linha; numa renderização adiada, guarda como refazê-la quando os dados chegarem."""
+    row_attr = ""
+    if is_render_deferred():
+        row_attr = f'data-row="{len(_RENDER.rows)}"'
+        _RENDER.rows.append((did, functools.partial(render_fn, *args, row_attr)))
+    return render_fn(*args, row_attr)
+
+def stream_rows(render_seq, rows):
+    """Troca na tela as linhas já calculadas, se a página ainda é a mesma renderização."""
+    if render_seq != RENDER_SEQ or mw.state != "deckBrowser": return
+    js = "".join(f"pdSetRow({idx}, {json.dumps(render())});" for idx, render in rows)
+    if js: mw.deckBrowser.web.eval(js)
+
+def start_background_stats(missing, rows=()):
+    """
+    Calcula em segundo plano o que faltou na renderização, enviando as linhas prontas
+    para a tela na ordem em que aparecem, e redesenha tudo ao final (totais e nível).
+    Enquanto isso, clear_stats_cache só marca os caches como sujos.
+    """
+    global STATS_JOB_RUNNING, LAST_JOB_SIGNATURE
+    if STATS_JOB_RUNNING: return
+    signature = (CACHE_GENERATION, frozenset((kind, item) for kind, items in missing.items() for item in items))
+    # O mesmo pedido já foi calculado nesta geração do cache e continuou faltando: não repete
+    if signature == LAST_JOB_SIGNATURE: return
+    LAST_JOB_SIGNATURE = signature
+    STATS_JOB_RUNNING = True
+
+    render_seq = RENDER_SEQ
+    pending = defaultdict(list)
+    for key in missing.get("decks", ()):
+        pending[key[0]].append(key)
+    # Decks na ordem das linhas visíveis; os que não têm linha ficam para o fim
+    order = list(dict.fromkeys([did for did, _ in rows if did in pending] + list(pending)))
+    rows_by_did = defaultdict(list)
+    for idx, (did, render) in enumerate(rows):
+        rows_by_did[did].append((idx, render))
+
+    def compute():
+        for leech_thr in missing.get("cards", ()):
+            get_cards_by_did(leech_thr)
+        # O XP/HP de todas as linhas sai de uma única passada, antes da primeira linha
+        if missing.get("rpg"):
+            get_rpg_tree_stats()
+        for start in range(0, len(order), STREAM_CHUNK):
+            chunk = [key for did in order[start:start + STREAM_CHUNK] for key in pending[did]]
+            goals_by_params = defaultdict(dict)
+            for did, streak_thr, leech_thr, deck_goal in chunk:
+                goals_by_params[(streak_thr, leech_thr)][did] = deck_goal
+            for (streak_thr, leech_thr), deck_goals in goals_by_params.items():
+                prefetch_deck_stats(list(deck_goals), streak_thr, leech_thr, deck_goals)
+            for did, streak_thr, leech_thr, deck_goal in chunk:
+                get_deck_stats_advanced(did, streak_thr, leech_thr, deck_goal)
+            ready = [row for did in order[start:start + STREAM_CHUNK] for row in rows_by_did[did]]
+            if ready:
+                mw.taskman.run_on_main(functools.partial(stream_rows, render_seq, ready))
+        for days, dids in missing.get("summary", ()):
+            get_global_daily_summary(days, list(dids))
+        if missing.get("header"):
+            get_header_stats()
+
+    def on_done(future):
+        global STATS_JOB_RUNNING, STATS_DIRTY
+        STATS_JOB_RUNNING = False
+        if STATS_DIRTY:
+            STATS_DIRTY = False
+            clear_stats_cache()
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Pinned Decks: Error computing stats in background: {e}")
+        if mw.state == "deckBrowser":
+            mw.deckBrowser.refresh()
+
+    mw.taskman.run_in_background(compute, on_done)
 
 # ==================== LÓGICA DE ORDENAÇÃO ====================
 
@@ -956,6 +1440,8 @@ def sort_pinned_decks(col_name):
     streak_thr = cfg.get("streak_threshold", 20)
     leech_thr = cfg.get("leech_threshold", 10)
     tree = mw.col.sched.deck_due_tree()
+    if col_name not in ("col_name", "col_counts", "show_time"):
+        prefetch_deck_stats(pinned, streak_thr, leech_thr)
 
     for did in pinned:
         node = find_node(tree, did)
@@ -1173,6 +1659,20 @@ def get_visual_counts(node, did):
 
 
 def render_node(node, depth, cfg, is_pinned_root, idx, total_count, col_widths, parent_id=None):
+    did = node.deck_id
+    html = render_streamed(did, render_row, node, depth, cfg, is_pinned_root, idx, total_count, col_widths, parent_id)
+
+    if len(node.children) > 0 and did in cfg.get("expanded_ids", []):
+        children = node.children
+        saved_order = cfg.get("child_sort_order", {}).get(str(did), [])
+        if saved_order:
+            order_map = {int(id): i for i, id in enumerate(saved_order)}
+            children.sort(key=lambda x: order_map.get(x.deck_id, 99999))
+        for i, c in enumerate(children):
+            html += render_node(c, depth+1, cfg, False, i, len(children), col_widths, parent_id=did)
+    return html
+
+def render_row(node, depth, cfg, is_pinned_root, idx, total_count, col_widths, parent_id=None, row_attr=""):
     did = node.deck_id
     name = node.name.split("::")[-1]
     full_name = node.name
@@ -1191,7 +1691,7 @@ def render_node(node, depth, cfg, is_pinned_root, idx, total_count, col_widths,
     style_bg = f'style="background-color:{row_bg} !important;"' if row_bg else ""
 
     # Descompactando os 21 itens retornados
-    maturity, retention, total_cards, tomorrow, done_today, speed, ease, leeches, mature_count_int, avg_time, _, total_stars, _, ease_counts, maturity_pct, retention_svg, reviews_svg, ease_svg, streak_qty_svg, streak_pct_svg, mature_cids_str = get_deck_stats_advanced(did, streak_thr, leech_thr, deck_goal)
+    maturity, retention, total_cards, tomorrow, done_today, speed, ease, leeches, mature_count_int, avg_time, _, total_stars, _, ease_counts, maturity_pct, retention_chart, reviews_chart, ease_chart, streak_qty_chart, streak_pct_chart, mature_cids_str = get_deck_stats_advanced(did, streak_thr, leech_thr, deck_goal)
     
     hp, xp, hp_pct = get_rpg_daily_stats(did)
     hp_color = "#5aff5a" if hp >= 70 else "#ff9d5a" if hp >= 30 else "#ff5a5a"
@@ -1241,8 +1741,8 @@ def render_node(node, depth, cfg, is_pinned_root, idx, total_count, col_widths,
         "show_avg_time": (avg_time, "inf", f'title="{LANG.get("avg_seconds_per_card", "Média")}"'),
         "show_speed": (speed, "inf", f'title="{LANG.get("speed_tooltip", "Velocidade")}"'),
         "show_goal": (f'<input type="number" value="{deck_goal}" onchange="pycmd(\'set_goal:{did},\'+this.value)" class="goal-input" title="Meta">{stars_html}', "inf", 'style="white-space:nowrap;"'),
-        "show_retention": (retention, "inf", f'data-chart="{html_lib.escape(retention_svg)}" onmouseover="showMovingChart(this, event)" onmousemove="moveChart(event)" onmouseout="hideChart()"' if retention_svg else ""),
-        "show_ease": (ease, "inf", f'data-chart="{html_lib.escape(ease_svg)}" onmouseover="showMovingChart(this, event)" onmousemove="moveChart(event)" onmouseout="hideChart()"' if ease_svg else ""),
+        "show_retention": (retention, "inf", f'data-chart-id="{retention_chart}" onmouseover="showMovingChart(this, event)" onmousemove="moveChart(event)" onmouseout="hideChart()"' if retention_chart else ""),
+        "show_ease": (ease, "inf", f'data-chart-id="{ease_chart}" onmouseover="showMovingChart(this, event)" onmousemove="moveChart(event)" onmouseout="hideChart()"' if ease_chart else ""),
         "show_leeches": (make_safe_link(leeches, f'deck:"{full_name}" prop:lapses>={leech_thr}', f'color:{"#ff5a5a" if leeches>0 else "var(--text-muted)"}') if leeches>0 else f'<span style="color:var(--text-muted)">{leeches}</span>', "inf", f'title="{LANG.get("leech_tooltip", "Sanguessugas").format(count=leech_thr)}"'),
         "show_tomorrow": (make_safe_link(tomorrow, f'deck:"{full_name}" prop:due=1', f'color:{"#ff9999" if tomorrow>50 else "var(--text-muted)"}') if tomorrow>0 else f'<span style="color:var(--text-muted)">{tomorrow}</span>', "inf", f'title="{LANG.get("tomorrow_tooltip", "Amanhã")}"'),
         "show_total": (total_cards, "inf", f'title="{LANG.get("total_tooltip", "Total")}"'),
@@ -1253,33 +1753,40 @@ def render_node(node, depth, cfg, is_pinned_root, idx, total_count, col_widths,
     cols_html = "".join(add_data_cell(k, *data_map[k]) for k in cfg.get("column_order", DEFAULT_COL_ORDER) if k in data_map)
 
     html = f'''
-    <tr class="pr" {drag_attrs} {style_bg}>
+    <tr class="pr" {row_attr} {drag_attrs} {style_bg}>
         {order_controls} {select_cell}
         <td class="nm" style="padding-left:{depth*20}px; position:relative; width:{col_widths.get("col_name", 300)}px;" data-col="col_name">
             <div style="display:flex; align-items:center; overflow:hidden;">{expander}<a href="#" onclick="pycmd('open:{did}');return false;" title="{full_name_esc}" style="white-space:nowrap; overflow:hidden; text-overflow:ellipsis;">{name_display}</a>{xp_display}</div>
             {hp_html} {progress_html} <div class="resizer" onmousedown="rsStart(event, 'col_name')"></div>
         </td>
-        <td class="st" style="position:relative; width:{col_widths.get("col_counts", 160)}px;" data-col="col_counts" {f'data-chart="{html_lib.escape(reviews_svg)}" onmouseover="showMovingChart(this, event)" onmousemove="moveChart(event)" onmouseout="hideChart()"' if reviews_svg else ""}>
+        <td class="st" style="position:relative; width:{col_widths.get("col_counts", 160)}px;" data-col="col_counts" {f'data-chart-id="{reviews_chart}" onmouseover="showMovingChart(this, event)" onmousemove="moveChart(event)" onmouseout="hideChart()"' if reviews_chart else ""}>
             <span class="n{'' if new else ' z'}">{new}</span><span class="l{' z' if not lrn else ''}">{lrn}</span><span class="d{' z' if not due else ''}">{due}</span>
             <div class="resizer" onmousedown="rsStart(event, 'col_counts')"></div>
         </td>
         {cols_html}
         <td class="op" style="position:relative; width:{col_widths.get("col_opts", 50)}px;" data-col="col_opts"><a href="#" onclick="pycmd('opts:{did}');return false;">⚙</a><div class="resizer" onmousedown="rsStart(event, 'col_opts')"></div></td>
     </tr>'''
+    return html
+
 
-    if has_kids and expanded:
+
+def render_grid_node(node, depth, cfg, streak_thr, leech_thr):
+    did = node.deck_id
+    html = render_streamed(did, render_grid_item, node, depth, cfg, streak_thr, leech_thr)
+
+    if len(node.children) > 0 and did in cfg.get("expanded_ids", []):
         children = node.children
         saved_order = cfg.get("child_sort_order", {}).get(str(did), [])
         if saved_order:
             order_map = {int(id): i for i, id in enumerate(saved_order)}
             children.sort(key=lambda x: order_map.get(x.deck_id, 99999))
-        for i, c in enumerate(children):
-            html += render_node(c, depth+1, cfg, False, i, len(children), col_widths, parent_id=did)
-    return html
-
+        
+        for c in children:
+            html += render_grid_node(c, depth+1, cfg, streak_thr, leech_thr)
 
+    return html
 
-def render_grid_node(node, depth, cfg, streak_thr, leech_thr):
+def render_grid_item(node, depth, cfg, streak_thr, leech_thr, row_attr=""):
     did = node.deck_id
     name = node.name.split("::")[-1]
     full_name = node.name
@@ -1305,7 +1812,7 @@ def render_grid_node(node, depth, cfg, streak_thr, leech_thr):
         cover_html = f'<img src="{cover_file}" class="grid-cover"><div class="grid-overlay"></div>'
         text_shadow_style = 'text-shadow: 0 1px 3px rgba(0,0,0,0.9); color: #fff;'
     
-    maturity, retention, total_cards, tomorrow, done_today, speed, ease, leeches, mature_count_int, avg_time, _, total_stars, _, ease_counts, maturity_pct, retention_svg, reviews_svg, ease_svg, streak_qty_svg, streak_pct_svg = get_deck_stats_advanced(did, streak_thr, leech_thr, deck_goal)
+    maturity, retention, total_cards, tomorrow, done_today, speed, ease, leeches, mature_count_int, avg_time, _, total_stars, _, ease_counts, maturity_pct, retention_chart, reviews_chart, ease_chart, streak_qty_chart, streak_pct_chart, _ = get_deck_stats_advanced(did, streak_thr, leech_thr, deck_goal)
     rpg_icon, rpg_title = get_rpg_icon(mature_count_int, total_cards)
     
     hp, xp, hp_pct = get_rpg_daily_stats(did)
@@ -1410,7 +1917,7 @@ def render_grid_node(node, depth, cfg, streak_thr, leech_thr):
     depth_style = f'border-left: 3px solid {border_color};' if depth > 0 else ''
 
     html = f'''
-    <div class="grid-item" style="{bg_style} {depth_style}" onclick="pycmd('open:{did}')" title="{full_name_esc} - {rpg_title}">
+    <div class="grid-item" {row_attr} style="{bg_style} {depth_style}" onclick="pycmd('open:{did}')" title="{full_name_esc} - {rpg_title}">
         {cover_html}
         <div class="grid-header" style="{text_shadow_style}">
             <div style="display:flex; align-items:center; gap:4px; overflow:hidden;">
@@ -1435,22 +1942,31 @@ def render_grid_node(node, depth, cfg, streak_thr, leech_thr):
         </div>
     </div>
     '''
-
-    if has_kids and expanded:
-        children = node.children
-        saved_order = cfg.get("child_sort_order", {}).get(str(did), [])
-        if saved_order:
-            order_map = {int(id): i for i, id in enumerate(saved_order)}
-            children.sort(key=lambda x: order_map.get(x.deck_id, 99999))
-        
-        for c in children:
-            html += render_grid_node(c, depth+1, cfg, streak_thr, leech_thr)
-
     return html
 
 
 
 def render_pinned(deck_browser, content):
+    """
+    Com "background_stats", a tela sai na hora com o que já está em cache e marcadores
+    no lugar do resto; o que faltou é calculado em segundo plano e a tela é redesenhada.
+    """
+    global RENDER_SEQ
+    RENDER_SEQ += 1
+    trim_caches()
+    if not load_config().get("background_stats", False):
+        return _render_pinned(deck_browser, content)
+    _RENDER.missing = defaultdict(set)
+    _RENDER.rows = []
+    try:
+        _render_pinned(deck_browser, content)
+    finally:
+        missing, rows = _RENDER.missing, _RENDER.rows
+        _RENDER.missing = _RENDER.rows = None
+    if missing:
+        start_background_stats(missing, rows)
+
+def _render_pinned(deck_browser, content):
     load_language()
     cfg = load_config()
     pinned = [d for d in cfg["pinned_ids"] if mw.col.decks.get(d)]
@@ -1460,6 +1976,8 @@ def render_pinned(deck_browser, content):
         save_config(cfg)
 
     tree = mw.col.sched.deck_due_tree()
+    if not is_render_deferred():
+        prefetch_deck_stats(get_visible_dids(tree, pinned, cfg), cfg.get("streak_threshold", 20), cfg.get("leech_threshold", 10))
     collapsed = cfg.get("is_collapsed", False)
     hide_original = cfg.get("hide_original_list", False)
     is_grid = cfg.get("is_grid_view", False)
@@ -1510,11 +2028,9 @@ def render_pinned(deck_browser, content):
         '''
         # --- FIM DA MODIFICAÇÃO ---
 
-    daily = get_daily_stats()
-    last_review_time = get_last_review_time()
+    daily, last_review_time, global_streak = get_header_stats()
     label_time = LANG.get("last_review_time_label", "Horário da última rev:")
     
-    global_streak = get_global_streak()
     label_streak = LANG.get("global_streak_label", "{day} dias seguidos").format(day=global_streak)
 
     checked_charts = "checked" if show_charts else ""
@@ -1606,28 +2122,18 @@ def render_pinned(deck_browser, content):
         
     tooltip_global = f"{LANG.get('global_progress', 'Global')}: {global_xp_sum}/4000 ({global_pct_val:.1f}%)"
     
-    global_chart_svg_escaped = ""
+    # O resumo diário e o SVG global só são montados quando o usuário passa o mouse
+    GLOBAL_CHART.clear()
+    global_chart_id = ""
     if show_charts:
-        global_daily_data = get_global_daily_summary(chart_days, dids=list(all_pinned_and_child_dids))
-        
-        if global_daily_data:
-            today_date_str = global_daily_data[-1][0]
-            global_daily_data[-1] = (today_date_str, global_reviews_today, global_xp_sum)
-
-        processed_data_for_chart = []
-        
-        for date, cards, daily_xp in global_daily_data:
-            level_title, _, _, _, _, _ = get_global_rpg_level(daily_xp)
-            processed_data_for_chart.append((date, cards, daily_xp, level_title))
-        
-        global_chart_svg = generate_global_stats_svg(processed_data_for_chart)
-        global_chart_svg_escaped = html_lib.escape(global_chart_svg)
+        GLOBAL_CHART["args"] = (chart_days, list(all_pinned_and_child_dids), global_reviews_today, global_xp_sum)
+        global_chart_id = "global"
 
     global_level_html = f'''
     <div id="global-level-container" 
          style="flex-grow:1; margin:0 15px; display:flex; flex-direction:column; justify-content:center;"
          onmouseover="showFixedChart(this, event)" onmouseout="hideChart()"
-         data-chart="{global_chart_svg_escaped}">
+         data-chart-id="{global_chart_id}">
         <div style="display:flex; justify-content:space-between; font-size:10px; color:var(--text-muted); margin-bottom:2px;">
             <span>{LANG.get("level", "Nvl")} {lvl_title}</span>
             <span>{global_xp_sum} XP</span>
@@ -1696,10 +2202,13 @@ def render_pinned(deck_browser, content):
     
     global_ease_str = "-"
     if pinned:
-        all_pinned_ids_str = ",".join(str(d) for d in pinned)
-        global_avg_ease = mw.col.db.scalar(f"SELECT avg(factor) FROM cards WHERE did IN ({all_pinned_ids_str}) AND queue != 0")
-        if global_avg_ease:
-            global_ease_str = f"{global_avg_ease/10:.0f}%"
+        cards_by_did = get_cards_by_did(leech_thr)
+        if cards_by_did is None:
+            global_ease_str = "…"
+        else:
+            _, _, pinned_factor_sum, pinned_factor_count, _ = sum_cards_stats(cards_by_did, pinned)
+            if pinned_factor_count and pinned_factor_sum:
+                global_ease_str = f"{pinned_factor_sum / pinned_factor_count / 10:.0f}%"
 
     streak_footer_count = total_streak
     streak_footer_pct = "0%"
@@ -1963,6 +2472,7 @@ def render_pinned(deck_browser, content):
         window.pdOver = function(e){{ e.preventDefault(); var tr = e.target.closest("tr[data-did]"); if(tr && tr.dataset.did !== srcDid) tr.classList.add("over"); }};
         window.pdLeave = function(e){{ var tr = e.target.closest("tr[data-did]"); if(tr) tr.classList.remove("over"); }};
         window.pdDrop = function(e){{ e.preventDefault(); e.stopPropagation(); document.querySelectorAll("tr.pr").forEach(r=>r.classList.remove("over", "drag")); var targetTr = e.target.closest("tr[data-did]"); var targetDid = targetTr ? targetTr.dataset.did : null; var droppedDid = e.dataTransfer.getData("text/plain") || e.dataTransfer.getData("anki-did") || srcDid; if(!droppedDid) return; if(targetDid && droppedDid !== targetDid) pycmd("insert_at:" + droppedDid + "," + targetDid); else if (!targetDid) pycmd("pin_end:" + droppedDid); srcDid = null; }};
+        window.pdSetRow = function(idx, html){{ var old = document.querySelector('[data-row="'+idx+'"]'); if(!old) return; var t = document.createElement("template"); t.innerHTML = html.trim(); old.replaceWith(t.content.firstElementChild); }};
         window.pdBoxDrop = function(e){{ e.preventDefault(); var droppedDid = e.dataTransfer.getData("anki-did") || srcDid; if(droppedDid) pycmd("pin_end:" + droppedDid); }};
         new MutationObserver(()=>{{ document.querySelectorAll('tr[id^="did"]:not([data-pd])').forEach(r=>{{ r.dataset.pd = "1"; r.draggable = true; r.ondragstart = e => {{ e.dataTransfer.setData("anki-did", r.id.slice(3)); }}; }}); }}).observe(document.body, {{childList:true, subtree:true}});
         var rsCol = null, rsStartX = 0, rsStartW = 0;
@@ -1976,25 +2486,38 @@ def render_pinned(deck_browser, content):
         
         var chartTooltip = document.getElementById('chart-tooltip');
         var hideChartTimer;
-        
-        window.showFixedChart = function(el, event) {{
-            clearTimeout(hideChartTimer);
-            var svgContent = el.dataset.chart;
+        var chartSvgs = {{}}, chartHoverEl = null;
+        {report_html.CHART_JS}
+
+        // Pede a série ao Python só no primeiro hover de cada gráfico e desenha aqui
+        function withChartSvg(el, show) {{
+            chartHoverEl = el;
+            var id = el.dataset.chartId;
+            if (!id) return;
+            if (id in chartSvgs) {{ show(chartSvgs[id]); return; }}
+            pycmd("chart:" + id, function(res) {{
+                var svg = res ? pdChartSvg(JSON.parse(res)) : "";
+                chartSvgs[id] = svg;
+                if (chartHoverEl === el) show(svg);
+            }});
+        }}
+
+        function showChart(svgContent, pointerEvents, event) {{
             if (!svgContent) return;
             chartTooltip.innerHTML = svgContent;
             chartTooltip.style.display = 'block';
-            chartTooltip.style.pointerEvents = 'auto';
+            chartTooltip.style.pointerEvents = pointerEvents;
             moveChart(event);
+        }}
+
+        window.showFixedChart = function(el, event) {{
+            clearTimeout(hideChartTimer);
+            withChartSvg(el, function(svg) {{ showChart(svg, 'auto', event); }});
         }};
 
         window.showMovingChart = function(el, event) {{
             clearTimeout(hideChartTimer);
-            var svgContent = el.dataset.chart;
-            if (!svgContent) return;
-            chartTooltip.innerHTML = svgContent;
-            chartTooltip.style.display = 'block';
-            chartTooltip.style.pointerEvents = 'none';
-            moveChart(event);
+            withChartSvg(el, function(svg) {{ showChart(svg, 'none', event); }});
         }};
 
         window.moveChart = function(e) {{
@@ -2014,6 +2537,7 @@ def render_pinned(deck_browser, content):
         }};
 
         window.hideChart = function() {{
+            chartHoverEl = null;
             hideChartTimer = setTimeout(function() {{
                 chartTooltip.style.display = 'none';
             }}, 300);
@@ -2051,6 +2575,7 @@ def render_pinned(deck_browser, content):
                                 {study_button_html}
                                 <span class="pd-btn" onclick="pycmd('toggle_grid')" title="{grid_title}">{grid_icon}</span>
                                 <span class="pd-btn" onclick="pycmd('export_html')" title="{LANG.get('generate_html_report', 'Relatório')}">📄</span>
+                                <span class="pd-btn" onclick="pycmd('rebuild_sidecar')" title="{LANG.get('rebuild_stats_db', 'Reconstruir Banco de Estatísticas')}">🔄</span>
                                 <span class="pd-btn" onclick="pycmd('toggle_original')" title="{eye_title}">{eye_icon}</span>
                                 <span class="pd-btn" onclick="pycmd('colap')">{arrow}</span>
                             </div>
@@ -2096,6 +2621,7 @@ def export_html_report():
     
     streak_thr = cfg.get("streak_threshold", 20)
     leech_thr = cfg.get("leech_threshold", 10)
+    prefetch_deck_stats(get_visible_dids(tree, pinned, cfg), streak_thr, leech_thr)
     
     rows_data = []
     
@@ -2167,9 +2693,7 @@ def export_html_report():
         if node:
             process_node(node, 0)
 
-    daily_stats = get_daily_stats()
-    last_rev = get_last_review_time()
-    glob_streak = get_global_streak()
+    daily_stats, last_rev, glob_streak = get_header_stats()
     
     html_content = report_html.generate_report(
         rows_data, totals, daily_stats, cfg, 
@@ -2217,6 +2741,15 @@ def handler(cmd):
         mw.deckBrowser.refresh()
     elif cmd == "export_html":
         export_html_report()
+    elif cmd == "rebuild_sidecar":
+        try:
+            if get_sidecar():
+                sidecar.rebuild(mw.col.db, mw.col.sched.day_cutoff)
+                clear_stats_cache()
+                tooltip(LANG.get("stats_db_rebuilt", "Banco de estatísticas reconstruído!"))
+        except Exception as e:
+            tooltip(f"Erro ao reconstruir o banco: {e}")
+        mw.deckBrowser.refresh()
     elif cmd.startswith("sort:"):
         col = cmd.split(":")[1]
         sort_pinned_decks(col)
@@ -2409,15 +2942,20 @@ def handler(cmd):
             c = load_config()
             c["chart_days"] = val
             save_config(c)
-            clear_stats_cache()
             mw.deckBrowser.refresh()
         except: pass
     elif cmd.startswith("toggle_charts"):
         c = load_config()
         c["show_charts"] = not c.get("show_charts", True)
         save_config(c)
-        clear_stats_cache()
         mw.deckBrowser.refresh()
+    elif cmd.startswith("chart:"):
+        try:
+            data = get_chart_data(cmd[6:])
+            return json.dumps(data) if data else ""
+        except Exception as e:
+            print(f"Pinned Decks: Error building chart: {e}")
+            return ""
     elif cmd.startswith("set_goal:"):
         try:
             parts = cmd[9:].split(",")
@@ -2428,7 +2966,7 @@ def handler(cmd):
             if "deck_goals" not in c: c["deck_goals"] = {}
             c["deck_goals"][did] = val
             save_config(c)
-            clear_stats_cache()
+            # As estrelas saem da contagem diária do sidecar; a meta nova só muda a chave do cache
             mw.deckBrowser.refresh()
         except: pass
     else:
@@ -2436,7 +2974,120 @@ def handler(cmd):
             mw.deckBrowser._old_handler(cmd)
 
 def on_review_answered(reviewer, card, ease):
+    # Cartões em baralho filtrado contam no did atual; odid cobre o baralho de origem
+    changed = {d for d in (card.did, card.odid) if d}
+    if STATS_JOB_RUNNING:
+        invalidate_decks(changed)
+        return
+    try:
+        apply_review_delta(card.id)
+    except Exception as e:
+        print(f"Pinned Decks: Error applying review to cached stats: {e}")
+        # Sem o delta, as linhas de hoje e o XP desses baralhos voltam a ser consultados
+        RPG_STALE.update(changed)
+        for loaded, _ in TODAY_CACHE.values(): loaded.difference_update(changed)
+        HEADER_CACHE.clear()
+    invalidate_decks(changed)
+
+# ==================== CACHE EM DISCO ====================
+
+def get_disk_cache_path():
+    return os.path.join(USER_FILES_DIR, f"stats_cache_{get_profile_slug()}.json")
+
+def collection_fingerprint():
+    """
+    Muda quando entram revisões (maior id e quantidade: as de outro dispositivo podem ter
+    ids antigos) ou quando cartões são criados, apagados ou alterados (quantidade e soma dos
+    mod: um cartão movido ou suspenso em outro dispositivo pode ter mod menor que o maior local).
+    """
+    return list(mw.col.db.first("SELECT max(id), count() FROM revlog")) + list(mw.col.db.first("SELECT count(), total(mod) FROM cards"))
+
+def save_disk_cache():
+    """
+    Grava os números já calculados hoje (sem gráficos), para a primeira renderização
+    depois de reabrir o Anki não refazer as consultas. Só vale com a mesma impressão digital.
+    """
+    if STATS_JOB_RUNNING or STATS_DIRTY: return
+    cutoff = mw.col.sched.day_cutoff
+    data = {
+        "fingerprint": collection_fingerprint(),
+        "cutoff": cutoff,
+        "stats": [[list(k), current_vals, list(scalars)] for k, (current_vals, scalars) in STATS_CACHE.items() if k[4] == cutoff],
+        "mature": [[list(k), cids] for k, cids in MATURE_CACHE.items() if k[2] == cutoff],
+        "stars": [[list(k), v] for k, v in STARS_CACHE.items() if k[2] == cutoff],
+        "cards": [[list(k), [[did, *row] for did, row in rows.items()]] for k, rows in CARDS_CACHE.items() if k[0] == mw.col.sched.today + 1 and k not in CARDS_STALE],
+        "rpg": [[list(k), [[did, *v] for did, v in cached["tree"].items()]] for k, cached in RPG_CACHE.items() if k[0] == cutoff and not RPG_STALE],
+        "header": HEADER_CACHE.get(cutoff),
+    }
+    try:
+        os.makedirs(USER_FILES_DIR, exist_ok=True)
+        path = get_disk_cache_path()
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+    except Exception as e:
+        print(f"Pinned Decks: Error saving stats cache: {e}")
+
+def load_disk_cache():
+    """Recarrega o que save_disk_cache gravou, se a coleção e o dia continuam os mesmos."""
+    path = get_disk_cache_path()
+    if not os.path.exists(path): return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("cutoff") != mw.col.sched.day_cutoff or data.get("fingerprint") != collection_fingerprint():
+            return
+        for k, current_vals, scalars in data["stats"]:
+            scalars[13] = {int(e): n for e, n in scalars[13].items()}
+            STATS_CACHE[tuple(k)] = (current_vals, tuple(scalars))
+        for k, cids in data["mature"]:
+            MATURE_CACHE[tuple(k)] = cids
+        for k, v in data["stars"]:
+            STARS_CACHE[tuple(k)] = v
+        for k, rows in data["cards"]:
+            CARDS_CACHE[tuple(k)] = {row[0]: tuple(row[1:]) for row in rows}
+        for k, tree in data["rpg"]:
+            RPG_CACHE[tuple(k)] = {"reviews": None, "own": None, "children": None, "tree": {row[0]: tuple(row[1:]) for row in tree}}
+        if data["header"]:
+            stats, last_ms, reviewed_today, global_streak = data["header"]
+            HEADER_CACHE[data["cutoff"]] = [{int(e): n for e, n in stats.items()}, last_ms, reviewed_today, global_streak]
+    except Exception as e:
+        print(f"Pinned Decks: Error loading stats cache: {e}")
+
+def on_profile_did_open():
+    # Os caches da coleção (cabeçalho, RPG, cartões) não levam o perfil na chave
+    clear_stats_cache()
+    load_disk_cache()
+    # Abre o histórico (e importa o da config) já na thread principal
+    try:
+        get_history_store()
+    except Exception as e:
+        print(f"Pinned Decks: Error opening stats history: {e}")
+
+def on_profile_will_close():
+    if CONFIG_TIMER is not None: CONFIG_TIMER.stop()
+    flush_config(force=True)
+    save_disk_cache()
+    clear_stats_cache()
+    history.close()
+    sidecar.close()
+
+def on_undo(*args):
+    # Desfazer uma resposta não tem delta; recomeça do banco
+    clear_stats_cache()
+
+def on_sync_will_start():
+    global SYNC_FINGERPRINT
+    SYNC_FINGERPRINT = collection_fingerprint()
+
+def on_sync_finished():
+    # Uma sincronização que não trouxe nada não descarta os caches (nem os lidos do disco)
+    if SYNC_FINGERPRINT is not None and SYNC_FINGERPRINT == collection_fingerprint(): return
     clear_stats_cache()
+    # Revisões de outros dispositivos podem ter ids abaixo do hwm do sidecar
+    if sidecar.current_path():
+        try: sidecar.verify(mw.col.db, mw.col.sched.day_cutoff)
+        except Exception as e: print(f"Pinned Decks: Error verifying sidecar: {e}")
 
 
 def cleanup_temp_deck_before_render(deck_browser, content):
@@ -2461,6 +3112,11 @@ def cleanup_temp_deck_before_render(deck_browser, content):
 gui_hooks.deck_browser_will_show_options_menu.append(on_options_menu)
 gui_hooks.deck_browser_will_render_content.append(render_pinned)
 gui_hooks.reviewer_did_answer_card.append(on_review_answered)
+gui_hooks.state_did_undo.append(on_undo)
+gui_hooks.sync_will_start.append(on_sync_will_start)
+gui_hooks.sync_did_finish.append(on_sync_finished)
+gui_hooks.profile_did_open.append(on_profile_did_open)
+gui_hooks.profile_will_close.append(on_profile_will_close)
 
 gui_hooks.deck_browser_will_render_content.append(cleanup_temp_deck_before_render)
 
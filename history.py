@@ -0,0 +1,106 @@
+# history.py
+# Histórico diário de ease e retenção de cada baralho (antes o "stats_history" do
+# pinned_config.json). Um banco SQLite pequeno por perfil, com uma linha por baralho e
+# dia; dias mais antigos que DAILY_DAYS são resumidos em uma linha por semana.
+
+import datetime
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deck_history (
+    did INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    span INTEGER NOT NULL,
+    ease INTEGER NOT NULL,
+    retention INTEGER NOT NULL,
+    PRIMARY KEY (did, day)
+) WITHOUT ROWID;
+"""
+
+# Dias guardados um a um; antes disso, uma linha por semana (span = WEEK) com as médias
+DAILY_DAYS = 400
+WEEK = 7
+
+_conn = None
+_path = None
+_lock = threading.RLock()
+
+def current_path():
+    return _path
+
+def open_db(path):
+    global _conn, _path
+    with _lock:
+        close()
+        _conn = sqlite3.connect(path, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode = WAL")
+        _conn.executescript(SCHEMA)
+        _path = path
+
+def close():
+    global _conn, _path
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+        _conn = None
+        _path = None
+
+def day_of_date(date_key):
+    """Dia (ordinal do calendário) de uma data "AAAA-MM-DD"."""
+    return datetime.date.fromisoformat(date_key).toordinal()
+
+def record(rows):
+    """Grava (did, dia, ease, retenção) de hoje; a linha do dia é substituída até o dia acabar."""
+    with _lock:
+        _conn.executemany("INSERT OR REPLACE INTO deck_history (did, day, span, ease, retention) VALUES (?, ?, 1, ?, ?)", rows)
+        _conn.commit()
+
+def import_config_history(stats_history):
+    """Copia o antigo {did: {"AAAA-MM-DD": {"ease", "retention"}}} da config para o banco."""
+    rows = []
+    for did_str, days in stats_history.items():
+        for date_key, values in days.items():
+            try:
+                rows.append((int(did_str), day_of_date(date_key), values.get("ease", 0), values.get("retention", 0)))
+            except (ValueError, AttributeError):
+                continue
+    with _lock:
+        _conn.executemany("INSERT OR IGNORE INTO deck_history (did, day, span, ease, retention) VALUES (?, ?, 1, ?, ?)", rows)
+        _conn.commit()
+
+def window(did, first_day, last_day):
+    """{dia: (ease, retenção)} de first_day a last_day; dias resumidos repetem a média da semana."""
+    with _lock:
+        rows = _conn.execute("""
+            SELECT day, span, ease, retention FROM deck_history
+            WHERE did = ? AND day > ? AND day <= ?
+            ORDER BY span DESC
+        """, (did, first_day - WEEK, last_day)).fetchall()
+    values = {}
+    for day, span, ease, retention in rows:
+        for d in range(day, day + span):
+            if first_day <= d <= last_day: values[d] = (ease, retention)
+    return values
+
+def compact(today):
+    """
+    Resume em uma linha por semana os dias anteriores a today - DAILY_DAYS. Só semanas
+    inteiras, alinhadas em múltiplos de WEEK, para que cada semana seja resumida uma vez.
+    Zeros são dias sem dado (o gráfico os completa pelo cubo) e ficam fora das médias.
+    """
+    limit = (today - DAILY_DAYS) // WEEK * WEEK
+    with _lock:
+        weeks = _conn.execute("""
+            SELECT did, day / ?1 * ?1,
+                CAST(ROUND(coalesce(AVG(NULLIF(ease, 0)), 0)) AS INTEGER),
+                CAST(ROUND(coalesce(AVG(NULLIF(retention, 0)), 0)) AS INTEGER)
+            FROM deck_history
+            WHERE span = 1 AND day < ?2
+            GROUP BY did, day / ?1
+        """, (WEEK, limit)).fetchall()
+        if not weeks: return
+        _conn.execute("DELETE FROM deck_history WHERE span = 1 AND day < ?", (limit,))
+        _conn.executemany("INSERT OR REPLACE INTO deck_history (did, day, span, ease, retention) VALUES (?, ?, ?, ?, ?)",
+                          [(did, day, WEEK, ease, retention) for did, day, ease, retention in weeks])
+        _conn.commit()
@@ -602,4 +602,89 @@ def generate_report(rows_data, totals, daily_stats, cfg, is_night, media_dir, la
     </html>
     """
     
-    return full_html
\ No newline at end of file
+    return full_html
+
+# Desenha no navegador os gráficos de hover a partir das séries JSON que o add-on devolve
+# para pycmd("chart:<id>") (ver get_chart_data em __init__.py).
+CHART_JS = r"""
+function pdEsc(s) { return String(s).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;"); }
+
+function pdChartSvg(d) { return d.type === "global" ? pdGlobalSvg(d) : pdDeckSvg(d); }
+
+function pdDeckSvg(d) {
+    var labels = d.labels, vals = d.values, n = labels.length;
+    if (!n) return "";
+    var width = Math.max(260, n * 40 + 80), height = 180, mt = 50, mb = 60, ml = 35, mr = 35;
+    var gh = height - mt - mb, gw = width - ml - mr;
+    var bars = d.type === "grouped_bar";
+    var flat = bars ? [].concat.apply([], vals) : vals;
+    var maxV = Math.max.apply(null, flat), dMin, range;
+    if (bars) { dMin = 0; range = maxV * 1.1 || 1; }
+    else { dMin = Math.max(0, Math.min.apply(null, flat) - 10); range = (maxV > 100 ? maxV * 1.05 : 100) - dMin || 10; }
+    var stepX = n > 1 ? gw / (n - 1) : gw / 2;
+    var out = ['<text x="' + width / 2 + '" y="20" font-family="sans-serif" font-size="12" font-weight="bold" fill="#555" text-anchor="middle">' + pdEsc(d.title) + '</text>',
+               '<rect x="' + ml + '" y="' + mt + '" width="' + gw + '" height="' + gh + '" fill="rgba(0,0,0,0.03)" />'];
+    var points = [], barColors = ["#4da6ff", "#ff5a5a", "#5aff5a"];
+    for (var i = 0; i < n; i++) {
+        var x = n > 1 ? ml + i * stepX : width / 2;
+        out.push('<line x1="' + x + '" y1="' + mt + '" x2="' + x + '" y2="' + (height - mb) + '" stroke="#000" stroke-opacity="0.1" stroke-width="1" />');
+        if (bars) {
+            // Novos, aprendendo e revisões lado a lado em torno do x do dia
+            var bw = Math.min(gw / n * 0.8, 50) / 3, yb = mt + gh;
+            for (var j = 0; j < 3; j++) {
+                var c = vals[i][j], h = c / range * gh, bx = x + (j - 1) * bw;
+                if (h > 0) {
+                    out.push('<rect x="' + (bx - bw / 2) + '" y="' + (yb - h) + '" width="' + bw + '" height="' + h + '" fill="' + barColors[j] + '" opacity="0.9" />');
+                    out.push('<text x="' + bx + '" y="' + (yb - h - 2) + '" font-family="sans-serif" font-size="8" fill="#333" text-anchor="middle">' + c + '</text>');
+                }
+            }
+        } else {
+            var y = mt + gh - (vals[i] - dMin) / range * gh;
+            points.push([x, y]);
+            out.push('<text x="' + x + '" y="' + (y - 8) + '" font-family="sans-serif" font-size="10" fill="#333" text-anchor="middle">' + vals[i] + '</text>');
+        }
+        out.push('<text transform="translate(' + (x + 3) + ', ' + (height - 10) + ') rotate(-90)" font-family="sans-serif" font-size="10" fill="#777" text-anchor="start">' + pdEsc(labels[i]) + '</text>');
+    }
+    if (points.length) {
+        out.push('<path d="M ' + points.map(function(p) { return p[0] + ' ' + p[1]; }).join(' L ') + '" fill="none" stroke="' + d.color + '" stroke-width="2" />');
+        points.forEach(function(p) { out.push('<circle cx="' + p[0] + '" cy="' + p[1] + '" r="3" fill="#fff" stroke="' + d.color + '" stroke-width="2" />'); });
+    }
+    return '<svg width="' + width + '" height="' + height + '" xmlns="http://www.w3.org/2000/svg" style="background:rgba(255,255,255,0.95); border-radius:4px; box-shadow:0 2px 5px rgba(0,0,0,0.1);">' + out.join('') + '</svg>';
+}
+
+function pdGlobalSvg(d) {
+    var n = d.labels.length;
+    if (!n) return "";
+    var width = n * 65 + 80, height = 240, m = {top: 60, bottom: 80, left: 40, right: 40};
+    var gh = height - m.top - m.bottom, gw = width - m.left - m.right;
+    // Escala pelo valor absoluto para comportar barras de XP negativas
+    var maxV = Math.max(Math.max.apply(null, d.cards), Math.max.apply(null, d.xp.map(Math.abs))) || 1;
+    var cardsLabel = pdEsc(d.cards_label);
+    var out = ['<text x="' + width / 2 + '" y="20" class="svg-title" text-anchor="middle">' + pdEsc(d.title) + '</text>',
+               '<rect x="' + (width / 2 - 70) + '" y="28" width="10" height="10" fill="#4da6ff" />',
+               '<text x="' + (width / 2 - 55) + '" y="37" class="svg-legend">' + cardsLabel + '</text>',
+               '<rect x="' + (width / 2 + 20) + '" y="28" width="10" height="10" fill="#ffd700" />',
+               '<text x="' + (width / 2 + 35) + '" y="37" class="svg-legend">XP</text>'];
+    var stepX = gw / n, bw = stepX * 0.35, base = m.top + gh, axisY = height - m.bottom + 15;
+    for (var i = 0; i < n; i++) {
+        var xb = m.left + i * stepX + stepX / 2;
+        var cards = d.cards[i], hc = cards > 0 ? cards / maxV * gh : 0, yc = base - hc;
+        out.push('<rect x="' + (xb - bw - 1) + '" y="' + yc + '" width="' + bw + '" height="' + hc + '" fill="#4da6ff"><title>' + cardsLabel + ': ' + cards + '</title></rect>');
+        if (cards > 0) out.push('<text x="' + (xb - bw / 2 - 1) + '" y="' + (yc - 3) + '" class="svg-bar-label" text-anchor="middle">' + cards + '</text>');
+        var xp = d.xp[i], hx = Math.abs(xp) / maxV * gh;
+        var yx = xp >= 0 ? base - hx : base, labelY = xp >= 0 ? yx - 3 : base + hx + 10;
+        out.push('<rect x="' + (xb + 1) + '" y="' + yx + '" width="' + bw + '" height="' + hx + '" fill="#ffd700"><title>XP: ' + xp + '</title></rect>');
+        if (xp !== 0) out.push('<text x="' + (xb + bw / 2 + 1) + '" y="' + labelY + '" class="svg-bar-label" text-anchor="middle">' + xp + '</text>');
+        out.push('<text transform="translate(' + (xb - 5) + ', ' + axisY + ') rotate(-60)" class="svg-axis-label" text-anchor="end">' + pdEsc(d.labels[i]) + '</text>');
+        out.push('<text transform="translate(' + (xb - 5) + ', ' + (axisY + 15) + ') rotate(-60)" class="svg-level-label" text-anchor="end">' + pdEsc(d.levels[i]) + '</text>');
+    }
+    return '<div style="max-width: 600px; overflow-x: auto; padding-bottom: 10px; background: rgba(255,255,255,0.95); border-radius: 4px;">'
+        + '<svg width="' + width + '" height="' + height + '" xmlns="http://www.w3.org/2000/svg"><style>'
+        + '.svg-title { font-family: sans-serif; font-size: 14px; font-weight: bold; fill: #333; } '
+        + '.svg-legend { font-family: sans-serif; font-size: 10px; fill: #555; } '
+        + '.svg-bar-label { font-family: sans-serif; font-size: 9px; fill: #333; } '
+        + '.svg-axis-label { font-family: sans-serif; font-size: 10px; fill: #777; } '
+        + '.svg-level-label { font-family: sans-serif; font-size: 9px; font-weight: bold; fill: #333; } '
+        + '</style>' + out.join('') + '</svg></div>';
+}
+"""
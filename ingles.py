@@ -75,6 +75,8 @@ t = {
     "toggle_list_view": "Switch to List",
     "toggle_grid_view": "Switch to Grid",
     "generate_html_report": "Generate HTML Report",
+    "rebuild_stats_db": "Rebuild Statistics Database",
+    "stats_db_rebuilt": "Statistics database rebuilt!",
     "hide_default_deck_list": "Hide default deck list",
     "show_default_deck_list": "Show default deck list",
     "lang_pt": "Switch to Portuguese",
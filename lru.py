@@ -0,0 +1,106 @@
+# lru.py
+# Caches com limite aproximado de memória: quando passam do limite, os itens usados há
+# mais tempo são descartados (LRU). Contam acertos, faltas e descartes para ajustar os limites:
+# só get() e [] contam, "in" e peek() não, para que cada busca conte uma vez. Uma entrada
+# gravada nesta renderização sem uma falta já contada (um prefetch logo antes da leitura)
+# conta como falta na primeira leitura.
+
+import sys
+from collections import OrderedDict
+
+def approx_size(value):
+    """Bytes aproximados de um valor e do que ele contém (str, números, tuplas, listas, sets, dicts)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list, set, frozenset)):
+        size += sum(approx_size(v) for v in value)
+    elif isinstance(value, dict):
+        size += sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    return size
+
+class BoundedCache(OrderedDict):
+    """
+    Dicionário comum para quem usa, com o tamanho de cada entrada somado na gravação.
+    O descarte só acontece em trim(), chamado entre renderizações, para que nada
+    gravado durante uma renderização suma antes de ser lido.
+    """
+
+    def __init__(self, name, max_bytes):
+        super().__init__()
+        self.name = name
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.sizes = {}
+        # Gravadas desde o último trim() e ainda não lidas / buscadas por get() sem sucesso
+        self.fresh = set()
+        self.missed = set()
+        self.hits = self.misses = self.evictions = 0
+
+    def __setitem__(self, key, value):
+        size = approx_size(key) + approx_size(value)
+        self.bytes += size - self.sizes.get(key, 0)
+        self.sizes[key] = size
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if key in self.missed: self.missed.discard(key)
+        else: self.fresh.add(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.bytes -= self.sizes.pop(key, 0)
+        self.fresh.discard(key)
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        if key in self.fresh:
+            self.fresh.discard(key)
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def get(self, key, default=None):
+        if key not in self:
+            self.misses += 1
+            self.missed.add(key)
+            return default
+        return self[key]
+
+    def peek(self, key, default=None):
+        """Como get(), sem contar: para reler o que acabou de ser calculado após uma falta."""
+        if key not in self: return default
+        self.move_to_end(key)
+        return super().__getitem__(key)
+
+    def pop(self, key, *default):
+        if key not in self:
+            if default: return default[0]
+            raise KeyError(key)
+        value = super().__getitem__(key)
+        del self[key]
+        return value
+
+    def resize(self, key, delta):
+        """Soma delta bytes a uma entrada alterada no lugar, sem medir tudo de novo."""
+        if key not in self.sizes: return
+        self.sizes[key] += delta
+        self.bytes += delta
+
+    def clear(self):
+        super().clear()
+        self.sizes.clear()
+        self.fresh.clear()
+        self.missed.clear()
+        self.bytes = 0
+
+    def trim(self):
+        """Descarta os itens menos usados até caber no limite."""
+        self.fresh.clear()
+        self.missed.clear()
+        while self.bytes > self.max_bytes and len(self):
+            del self[next(iter(self))]
+            self.evictions += 1
+
+    def stats(self):
+        return {"name": self.name, "entries": len(self), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
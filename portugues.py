@@ -75,6 +75,8 @@ t = {
     "toggle_list_view": "Alternar para Lista",
     "toggle_grid_view": "Alternar para Grade",
     "generate_html_report": "Gerar Relatório HTML",
+    "rebuild_stats_db": "Reconstruir Banco de Estatísticas",
+    "stats_db_rebuilt": "Banco de estatísticas reconstruído!",
     "hide_default_deck_list": "Ocultar lista de decks padrão",
     "show_default_deck_list": "Mostrar lista de decks padrão",
     "lang_pt": "Mudar para Português",
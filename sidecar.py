@@ -0,0 +1,504 @@
+# sidecar.py
+import json
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+
+# Banco auxiliar do add-on: uma cópia desnormalizada do revlog (com did e dia) e
+# índices derivados dela, atualizados de forma incremental a partir do maior id de
+# revisão já processado (hwm).
+
+SCHEMA_VERSION = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+CREATE TABLE IF NOT EXISTS revlog_rows (
+    id INTEGER PRIMARY KEY,
+    cid INTEGER NOT NULL,
+    did INTEGER,
+    day INTEGER NOT NULL,
+    ease INTEGER NOT NULL,
+    type INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    factor INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_revlog_rows_did ON revlog_rows (did, id, time);
+CREATE INDEX IF NOT EXISTS ix_revlog_rows_cid ON revlog_rows (cid, id, ease);
+CREATE INDEX IF NOT EXISTS ix_revlog_rows_day ON revlog_rows (day);
+CREATE TABLE IF NOT EXISTS card_streak (
+    cid INTEGER PRIMARY KEY,
+    streak INTEGER NOT NULL,
+    last_lapse INTEGER NOT NULL,
+    last_id INTEGER NOT NULL,
+    reps INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_card_streak_streak ON card_streak (streak);
+CREATE INDEX IF NOT EXISTS ix_card_streak_last_id ON card_streak (last_id);
+CREATE TABLE IF NOT EXISTS day_cube (
+    did INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    again INTEGER NOT NULL,
+    hard INTEGER NOT NULL,
+    good INTEGER NOT NULL,
+    easy INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    new INTEGER NOT NULL,
+    lrn INTEGER NOT NULL,
+    rev INTEGER NOT NULL,
+    time_ms INTEGER NOT NULL,
+    factor_sum INTEGER NOT NULL,
+    streak_att INTEGER NOT NULL,
+    streak_ok INTEGER NOT NULL,
+    xp INTEGER,
+    PRIMARY KEY (did, day)
+) WITHOUT ROWID;
+"""
+
+# Colunas somáveis do cubo baralho × dia, na ordem das consultas. streak_att/streak_ok usam o
+# número da revisão no cartão no momento da revisão (não o cards.reps atual), como o gráfico
+# sempre fez: assim o número de hoje no bloco é o mesmo do último ponto do gráfico.
+CUBE_COLS = ("again", "hard", "good", "easy", "total", "new", "lrn", "rev", "time_ms", "factor_sum", "streak_att", "streak_ok")
+
+DEFAULT_STREAK_THRESHOLD = 20
+
+# Só um ajuste do SQLite: as páginas do banco são lidas do cache do sistema por mmap, sem a
+# cópia extra para o cache de páginas do próprio SQLite. As linhas das consultas continuam
+# virando tuplas do Python; não há um snapshot em colunas.
+MMAP_SIZE = 256 * 1024 * 1024
+
+_conn = None
+_path = None
+_lock = threading.RLock()
+
+def current_path():
+    return _path
+
+def open_db(path):
+    global _conn, _path
+    with _lock:
+        close()
+        _conn = sqlite3.connect(path, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode = WAL")
+        _conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        _conn.executescript(SCHEMA)
+        if get_meta("schema") != SCHEMA_VERSION:
+            _drop_all()
+            _conn.executescript(SCHEMA)
+            set_meta("schema", SCHEMA_VERSION)
+            _conn.commit()
+        _path = path
+
+def migrate(old_path, path):
+    """Move um banco de um local antigo (com os arquivos do WAL), se ainda não houver um no novo."""
+    if os.path.exists(path) or not os.path.exists(old_path): return
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(old_path + suffix):
+            os.replace(old_path + suffix, path + suffix)
+
+def close():
+    global _conn, _path
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+        _conn = None
+        _path = None
+
+def _drop_all():
+    tables = [r[0] for r in _conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    for name in tables:
+        _conn.execute(f"DROP TABLE IF EXISTS {name}")
+
+def get_meta(key, default=None):
+    row = _conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+def set_meta(key, value):
+    _conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+def day_of(rid, rollover):
+    """Número absoluto do dia de uma revisão, com a virada de dia do Anki."""
+    return (rid // 1000 - rollover) // 86400
+
+def _chunks(items, size=500):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+# ==================== FILTRO DE BARALHOS ====================
+
+# O conjunto de baralhos vai como um único parâmetro JSON: o texto da consulta não
+# muda com a quantidade de baralhos (e pode ser reaproveitado) nem esbarra no limite do SQL.
+# DECK_SET (CTE) só no banco do sidecar: o DBProxy do Anki trata todo comando que não começa
+# com SELECT como escrita (descarta o desfazer), então no mw.col.db vai IN_DECK_SET, inline.
+DECK_SET = "deck_set(did) AS (SELECT value FROM json_each(?))"
+IN_DECK_SET = "(SELECT value FROM json_each(?))"
+
+def deck_set_arg(dids):
+    return json.dumps([int(d) for d in dids])
+
+# ==================== INGESTÃO ====================
+
+def rebuild(col_db, day_cutoff):
+    """Descarta os índices e os reconstrói do revlog inteiro."""
+    with _lock:
+        _conn.execute("DELETE FROM revlog_rows")
+        _conn.execute("DELETE FROM card_streak")
+        _conn.execute("DELETE FROM day_cube")
+        # Só o estado da sequência global; streak_thr fica, é o limiar com que o cubo é refeito
+        _conn.execute("DELETE FROM meta WHERE key IN ('streak_day', 'streak_len', 'streak_rollover')")
+        set_meta("hwm", 0)
+        set_meta("rows", 0)
+        _conn.commit()
+        sync(col_db, day_cutoff)
+
+def verify(col_db, day_cutoff):
+    """
+    Confere se o revlog ainda bate com o que foi ingerido. Revisões antigas
+    que chegam depois pela sincronização ficam abaixo do hwm e exigem reconstrução.
+    """
+    with _lock:
+        hwm = get_meta("hwm", 0)
+        if not hwm: return
+        count = col_db.scalar(f"SELECT count() FROM revlog WHERE id <= {hwm}")
+        if count != get_meta("rows", 0):
+            rebuild(col_db, day_cutoff)
+            return
+        refresh_moved_cards(col_db)
+        _conn.commit()
+
+def sync(col_db, day_cutoff):
+    """Ingere as revisões com id acima do hwm."""
+    with _lock:
+        rollover = day_cutoff % 86400
+        hwm = get_meta("hwm", 0)
+        if hwm and not col_db.scalar(f"SELECT 1 FROM revlog WHERE id = {hwm}"):
+            hwm = _rewind(col_db)
+        if not hwm:
+            _build(col_db, rollover)
+        else:
+            if get_meta("rollover") != rollover:
+                # Mudou a hora de virada do dia (ou o fuso): os dias antigos são reagrupados
+                _conn.execute("UPDATE revlog_rows SET day = (id / 1000 - ?) / 86400", (rollover,))
+                _build_cube(rollover, 0)
+            _ingest_tail(col_db, hwm)
+        _conn.commit()
+
+# Origem das linhas do cubo: o revlog da coleção (com o did atual do cartão) ou a cópia do sidecar
+REVLOG_SOURCE = """
+    SELECT revlog.id AS id, revlog.cid AS cid, cards.did AS did, revlog.ease AS ease,
+        revlog.type AS type, revlog.time AS time, revlog.factor AS factor
+    FROM revlog
+    LEFT JOIN cards ON revlog.cid = cards.id
+"""
+MIRROR_SOURCE = "SELECT id, cid, did, ease, type, time, factor FROM revlog_rows"
+
+def _cube_query(source, table, rollover, streak_threshold, since_day, dids):
+    """
+    Consulta das linhas (did, day, *CUBE_COLS) a partir de since_day. O número da revisão
+    no cartão (para o streak) vem de um ROW_NUMBER sobre o histórico dos cartões do período.
+    """
+    start_ms = (since_day * 86400 + rollover) * 1000
+    window_filter = "1"
+    if since_day > 0: window_filter = f"cid IN (SELECT cid FROM {table} WHERE id >= ?3)"
+    args = [rollover, streak_threshold, start_ms]
+    deck_filter = ""
+    if dids is not None:
+        # Sem CTE: esta consulta também roda no banco da coleção (cube_from_revlog)
+        deck_filter = "AND r.did IN (SELECT value FROM json_each(?4))"
+        args.append(deck_set_arg(dids))
+    return f"""
+        SELECT r.did, (r.id / 1000 - ?1) / 86400 AS day,
+            sum(case when r.ease = 1 then 1 else 0 end),
+            sum(case when r.ease = 2 then 1 else 0 end),
+            sum(case when r.ease = 3 then 1 else 0 end),
+            sum(case when r.ease = 4 then 1 else 0 end),
+            count(),
+            sum(case when r.type = 0 then 1 else 0 end),
+            sum(case when r.type = 2 then 1 else 0 end),
+            sum(case when r.type = 1 then 1 else 0 end),
+            sum(r.time),
+            sum(case when r.ease > 0 then r.factor else 0 end),
+            sum(case when r.type = 1 and r.rep >= ?2 then 1 else 0 end),
+            sum(case when r.type = 1 and r.rep >= ?2 and r.ease > 1 then 1 else 0 end)
+        FROM (
+            SELECT id, did, ease, type, time, factor,
+                ROW_NUMBER() OVER (PARTITION BY cid ORDER BY id) AS rep
+            FROM ({source})
+            WHERE {window_filter}
+        ) r
+        WHERE r.id >= ?3 AND r.did IS NOT NULL {deck_filter}
+        GROUP BY r.did, day
+    """, args
+
+def cube_from_revlog(col_db, rollover, streak_threshold, since_day=0, dids=None):
+    """Linhas (did, day, *CUBE_COLS) calculadas direto do revlog da coleção."""
+    if dids is not None and not dids: return []
+    sql, args = _cube_query(REVLOG_SOURCE, "revlog", rollover, streak_threshold, since_day, dids)
+    return col_db.all(sql, *args)
+
+def _build_cube(rollover, since_day):
+    """Recalcula o cubo a partir de since_day, pela cópia do revlog. O XP volta a ser calculado sob demanda."""
+    sql, args = _cube_query(MIRROR_SOURCE, "revlog_rows", rollover, get_meta("streak_thr", DEFAULT_STREAK_THRESHOLD), since_day, None)
+    rows = _conn.execute(sql, args).fetchall()
+    _conn.execute("DELETE FROM day_cube WHERE day >= ?", (since_day,))
+    _conn.executemany(f"INSERT INTO day_cube (did, day, {', '.join(CUBE_COLS)}) VALUES ({', '.join('?' * (len(CUBE_COLS) + 2))})", rows)
+    set_meta("rollover", rollover)
+
+def _copy_revlog(col_db, after_id, until_id, rollover, batch=50000):
+    """Copia as revisões com id em (after_id, until_id] para revlog_rows, em lotes."""
+    copied = 0
+    while True:
+        rows = col_db.all(f"""
+            SELECT revlog.id, revlog.cid, cards.did, (revlog.id / 1000 - {rollover}) / 86400,
+                revlog.ease, revlog.type, revlog.time, revlog.factor
+            FROM revlog
+            LEFT JOIN cards ON revlog.cid = cards.id
+            WHERE revlog.id > {after_id} AND revlog.id <= {until_id}
+            ORDER BY revlog.id
+            LIMIT {batch}
+        """)
+        if not rows: return copied
+        _conn.executemany("INSERT OR REPLACE INTO revlog_rows (id, cid, did, day, ease, type, time, factor) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        copied += len(rows)
+        after_id = rows[-1][0]
+
+def _build(col_db, rollover):
+    hwm = col_db.scalar("SELECT max(id) FROM revlog") or 0
+    set_meta("cards_mod", col_db.scalar("SELECT max(mod) FROM cards") or 0)
+    _conn.execute("DELETE FROM revlog_rows")
+    copied = _copy_revlog(col_db, 0, hwm, rollover)
+    rows = _conn.execute("""
+        SELECT cid,
+            sum(case when ease > 1 and id > last_lapse then 1 else 0 end),
+            last_lapse,
+            max(id),
+            count()
+        FROM (
+            SELECT cid, id, ease,
+                MAX(CASE WHEN ease = 1 THEN id ELSE 0 END) OVER (PARTITION BY cid) AS last_lapse
+            FROM revlog_rows
+        )
+        GROUP BY cid
+    """).fetchall()
+    _conn.execute("DELETE FROM card_streak")
+    _conn.executemany("INSERT INTO card_streak (cid, streak, last_lapse, last_id, reps) VALUES (?, ?, ?, ?, ?)", rows)
+    _build_cube(rollover, 0)
+    set_meta("hwm", hwm)
+    set_meta("rows", copied)
+
+def refresh_moved_cards(col_db):
+    """
+    As revisões (e o cubo) ficam no baralho atual do cartão, como nas consultas diretas ao
+    revlog. Cartões mudados desde a última passagem (cards.mod) que trocaram de baralho têm
+    as revisões movidas, e o cubo dos baralhos de origem e destino é refeito, com o XP.
+    """
+    last_mod = get_meta("cards_mod", 0)
+    # >=: cartões alterados no mesmo segundo da última passagem são conferidos de novo
+    changed = col_db.all("SELECT id, did, mod FROM cards WHERE mod >= ?", last_mod)
+    if not changed: return
+    _conn.execute("CREATE TEMP TABLE IF NOT EXISTS card_deck (cid INTEGER PRIMARY KEY, did INTEGER NOT NULL)")
+    _conn.execute("DELETE FROM card_deck")
+    _conn.executemany("INSERT INTO card_deck (cid, did) VALUES (?, ?)", [(cid, did) for cid, did, _ in changed])
+    moved = _conn.execute("""
+        SELECT DISTINCT r.did, t.did FROM revlog_rows r JOIN card_deck t ON t.cid = r.cid
+        WHERE r.did IS NOT t.did
+    """).fetchall()
+    if moved:
+        _conn.execute("""
+            UPDATE revlog_rows SET did = (SELECT did FROM card_deck WHERE card_deck.cid = revlog_rows.cid)
+            WHERE cid IN (SELECT cid FROM card_deck)
+        """)
+        dids = {d for pair in moved for d in pair if d is not None}
+        sql, args = _cube_query(MIRROR_SOURCE, "revlog_rows", get_meta("rollover", 0), get_meta("streak_thr", DEFAULT_STREAK_THRESHOLD), 0, dids)
+        rows = _conn.execute(sql, args).fetchall()
+        _conn.execute(f"WITH {DECK_SET} DELETE FROM day_cube WHERE did IN (SELECT did FROM deck_set)", (deck_set_arg(dids),))
+        _conn.executemany(f"INSERT INTO day_cube (did, day, {', '.join(CUBE_COLS)}) VALUES ({', '.join('?' * (len(CUBE_COLS) + 2))})", rows)
+    set_meta("cards_mod", max(mod for _, _, mod in changed))
+
+def _load_streaks(cids):
+    state = {}
+    for chunk in _chunks(cids):
+        marks = ",".join("?" * len(chunk))
+        for cid, streak, last_lapse, last_id, reps in _conn.execute(
+            f"SELECT cid, streak, last_lapse, last_id, reps FROM card_streak WHERE cid IN ({marks})", chunk
+        ):
+            state[cid] = [streak, last_lapse, last_id, reps]
+    return state
+
+def _apply_reviews(state, reviews):
+    for rid, cid, ease in reviews:
+        s = state.setdefault(cid, [0, 0, 0, 0])
+        if ease == 1:
+            s[0] = 0
+            s[1] = rid
+        elif ease > 1:
+            s[0] += 1
+        s[2] = rid
+        s[3] += 1
+
+def _ingest_tail(col_db, hwm):
+    rollover = get_meta("rollover", 0)
+    if not _copy_revlog(col_db, hwm, col_db.scalar("SELECT max(id) FROM revlog") or 0, rollover): return
+    rows = _conn.execute(
+        "SELECT id, cid, ease, type, time, factor, did, day FROM revlog_rows WHERE id > ? ORDER BY id", (hwm,)
+    ).fetchall()
+    reviews = [r[:3] for r in rows]
+    state = _load_streaks({cid for _, cid, _ in reviews})
+
+    streak_threshold = get_meta("streak_thr", DEFAULT_STREAK_THRESHOLD)
+    cube = defaultdict(lambda: [0] * len(CUBE_COLS))
+    for rid, cid, ease, type, time_ms, factor, did, day in rows:
+        _apply_reviews(state, ((rid, cid, ease),))
+        if did is None: continue
+        c = cube[(did, day)]
+        if 1 <= ease <= 4: c[ease - 1] += 1
+        c[4] += 1
+        if type == 0: c[5] += 1
+        elif type == 2: c[6] += 1
+        elif type == 1:
+            c[7] += 1
+            if state[cid][3] >= streak_threshold:
+                c[10] += 1
+                if ease > 1: c[11] += 1
+        c[8] += time_ms
+        if ease > 0: c[9] += factor
+
+    _conn.executemany(
+        "INSERT OR REPLACE INTO card_streak (cid, streak, last_lapse, last_id, reps) VALUES (?, ?, ?, ?, ?)",
+        [(cid, *s) for cid, s in state.items()]
+    )
+    # O XP do dia depende de todas as revisões do dia: volta a ser calculado sob demanda
+    _conn.executemany(
+        f"""INSERT INTO day_cube (did, day, {', '.join(CUBE_COLS)}) VALUES ({', '.join('?' * (len(CUBE_COLS) + 2))})
+        ON CONFLICT (did, day) DO UPDATE SET {', '.join(f'{c} = {c} + excluded.{c}' for c in CUBE_COLS)}, xp = NULL""",
+        [(did, day, *c) for (did, day), c in cube.items()]
+    )
+    set_meta("hwm", reviews[-1][0])
+    set_meta("rows", get_meta("rows", 0) + len(reviews))
+
+def _rewind(col_db):
+    """
+    A revisão do hwm sumiu (ex.: desfazer no revisor). Recalcula só os cartões
+    cuja última revisão conhecida ficou acima do novo topo do revlog.
+    """
+    hwm = get_meta("hwm", 0)
+    new_hwm = col_db.scalar(f"SELECT max(id) FROM revlog WHERE id < {hwm}") or 0
+    if not new_hwm: return 0
+    _conn.execute("DELETE FROM revlog_rows WHERE id > ?", (new_hwm,))
+    cids = [r[0] for r in _conn.execute("SELECT cid FROM card_streak WHERE last_id > ?", (new_hwm,))]
+    _conn.execute("DELETE FROM card_streak WHERE last_id > ?", (new_hwm,))
+    state = {}
+    _apply_reviews(state, _conn.execute(
+        "SELECT id, cid, ease FROM revlog_rows WHERE cid IN (SELECT value FROM json_each(?)) ORDER BY id",
+        (json.dumps(cids),)
+    ))
+    _conn.executemany(
+        "INSERT OR REPLACE INTO card_streak (cid, streak, last_lapse, last_id, reps) VALUES (?, ?, ?, ?, ?)",
+        [(cid, *s) for cid, s in state.items()]
+    )
+    _build_cube(get_meta("rollover", 0), day_of(new_hwm, get_meta("rollover", 0)))
+    set_meta("hwm", new_hwm)
+    set_meta("rows", col_db.scalar(f"SELECT count() FROM revlog WHERE id <= {new_hwm}"))
+    return new_hwm
+
+# ==================== CONSULTAS ====================
+
+def mature_cids(cids, streak_threshold):
+    """
+    Dos cartões dados (os dos baralhos pedidos, vindos de cards), os que têm a sequência
+    atual de acertos no limite. Cada um é uma busca pela chave do card_streak.
+    """
+    with _lock:
+        return {r[0] for r in _conn.execute(
+            "SELECT cid FROM card_streak WHERE cid IN (SELECT value FROM json_each(?)) AND streak >= ?",
+            (json.dumps(list(cids)), streak_threshold)
+        )}
+
+def goal_stars(dids, goal, before_day=None):
+    """Soma de count // goal sobre as revisões diárias dos baralhos (só antes de before_day, se dado)."""
+    if goal <= 0 or not dids: return 0
+    day_filter = "AND day < ?3" if before_day is not None else ""
+    args = (deck_set_arg(dids), goal) + ((before_day,) if before_day is not None else ())
+    with _lock:
+        return _conn.execute(f"""
+            WITH deck_set(did) AS (SELECT value FROM json_each(?1))
+            SELECT coalesce(sum(cnt / ?2), 0)
+            FROM (SELECT sum(total) AS cnt FROM day_cube WHERE did IN (SELECT did FROM deck_set) {day_filter} GROUP BY day)
+        """, args).fetchone()[0]
+
+def day_cube(dids, first_day, streak_threshold, leech_threshold):
+    """
+    Linhas (did, day, *CUBE_COLS, xp) dos baralhos a partir de first_day. Mudar o limite
+    de streak recalcula o cubo; mudar o de sanguessuga só descarta o XP guardado.
+    """
+    with _lock:
+        if get_meta("streak_thr", DEFAULT_STREAK_THRESHOLD) != streak_threshold:
+            set_meta("streak_thr", streak_threshold)
+            _build_cube(get_meta("rollover", 0), 0)
+        if get_meta("xp_leech") != leech_threshold:
+            _conn.execute("UPDATE day_cube SET xp = NULL")
+            set_meta("xp_leech", leech_threshold)
+        _conn.commit()
+        return _conn.execute(
+            f"WITH {DECK_SET} SELECT did, day, {', '.join(CUBE_COLS)}, xp FROM day_cube WHERE did IN (SELECT did FROM deck_set) AND day >= ?",
+            (deck_set_arg(dids), first_day)
+        ).fetchall()
+
+def recent_times(dids, limit=100):
+    """(did, id, time) das últimas revisões de cada baralho, direto do índice (did, id, time)."""
+    with _lock:
+        rows = []
+        for did in dids:
+            rows.extend((did, rid, t) for rid, t in _conn.execute(
+                "SELECT id, time FROM revlog_rows WHERE did = ? ORDER BY id DESC LIMIT ?", (did, limit)
+            ))
+        return rows
+
+def set_xp(values):
+    """Guarda o XP calculado: (xp, did, day)."""
+    with _lock:
+        if _conn is None: return
+        _conn.executemany("UPDATE day_cube SET xp = ? WHERE did = ? AND day = ?", values)
+        _conn.commit()
+
+def global_streak(day_cutoff, reviewed_today):
+    """
+    Dias seguidos de estudo. O contador (último dia ativo + tamanho) fica salvo e
+    só avança olhando hoje e ontem; a cópia do revlog só é lida para cobrir dias sem registro.
+    """
+    with _lock:
+        rollover = day_cutoff % 86400
+        today = (day_cutoff - rollover) // 86400 - 1
+        last_day = get_meta("streak_day")
+        length = get_meta("streak_len", 0)
+        if get_meta("streak_rollover") != rollover or (last_day is not None and last_day > today):
+            last_day, length = None, 0
+
+        if last_day == today and not reviewed_today:
+            # As revisões de hoje foram desfeitas
+            last_day, length = today - 1, length - 1
+        elif last_day == today - 1 and reviewed_today:
+            last_day, length = today, length + 1
+        elif last_day is None or last_day < today - 1:
+            since = last_day + 1 if last_day is not None else 0
+            days = {r[0] for r in _conn.execute("SELECT DISTINCT day FROM revlog_rows WHERE day >= ? AND day <= ?", (since, today))}
+            if days:
+                current = max(days)
+                run = 0
+                while current in days:
+                    run += 1
+                    current -= 1
+                if current == last_day: run += length
+                last_day, length = max(days), run
+
+        set_meta("streak_day", last_day)
+        set_meta("streak_len", length)
+        set_meta("streak_rollover", rollover)
+        _conn.commit()
+        if last_day is not None and last_day >= today - 1:
+            return length
+        return 0
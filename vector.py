@@ -0,0 +1,94 @@
+# vector.py
+# Versões vetorizadas (NumPy) dos laços de XP e HP das revisões. O NumPy é opcional:
+# sem ele, AVAILABLE fica False e o add-on continua com os laços em Python.
+
+import itertools
+
+try:
+    import numpy as np
+    AVAILABLE = True
+except ImportError:
+    np = None
+    AVAILABLE = False
+
+# Cada chamada vetorizada tem um custo fixo (~0,1 ms) que o laço em Python só alcança
+# por volta de 150-200 revisões, já com as colunas montadas; abaixo disso fica o laço.
+MIN_ROWS = 200
+
+def columns(reviews, width=9):
+    """Linhas (rid, cid, ease, time, factor, lapses, ivl, reps, prev_time, ...) como colunas int64, numa única cópia."""
+    flat = np.fromiter(itertools.chain.from_iterable(reviews), dtype=np.int64, count=len(reviews) * width)
+    return flat.reshape(-1, width).T
+
+def group_columns(cols, *keys):
+    """
+    {(chave, ...): colunas do grupo} pelas chaves dadas (arrays do mesmo tamanho), com
+    cada grupo na ordem original das linhas: converte-se uma vez e divide-se aqui.
+    """
+    if not cols.shape[1]: return {}
+    order = np.lexsort(keys[::-1])
+    sorted_keys = [key[order] for key in keys]
+    change = np.zeros(len(order) - 1, dtype=bool)
+    for key in sorted_keys: change |= key[1:] != key[:-1]
+    bounds = np.flatnonzero(change) + 1
+    starts = [0] + bounds.tolist()
+    return {tuple(int(key[start]) for key in sorted_keys): cols[:, idx]
+            for start, idx in zip(starts, np.split(order, bounds))}
+
+def _run_length(hit):
+    """Tamanho da sequência de acertos consecutivos terminando em cada posição (0 onde hit é False)."""
+    idx = np.arange(len(hit))
+    last_miss = np.maximum.accumulate(np.where(hit, -1, idx))
+    return np.where(hit, idx - last_miss, 0)
+
+def calculate_xp(cols, leech_thr):
+    """Mesmo resultado de _calculate_xp_from_reviews, a partir das colunas de columns()."""
+    total_reviews = cols.shape[1]
+    if not total_reviews: return 0
+    _, cid, ease, time_ms, factor, lapses, ivl, reps, lag_time = cols
+    failed = ease == 1
+    passed = ~failed
+
+    base_xp = np.where(factor >= 2500, 1, (2600 - factor) // 50)
+    gain = base_xp.astype(np.float64)
+    no_gain = ((reps > 10) & (factor > 1900)) | (ivl > 100)
+    gain[no_gain] = 0
+    gain[~no_gain & (lapses >= leech_thr)] += 15
+    streak = _run_length(passed)
+    gain[(gain > 0) & (streak >= 10)] *= 2.0
+    gain[(gain > 0) & (streak >= 5) & (streak < 10)] *= 1.5
+
+    # Tempo anterior: a revisão aprovada anterior do mesmo cartão na lista, ou o LAG na primeira
+    prev_time = lag_time.copy()
+    order = np.flatnonzero(passed)
+    order = order[np.argsort(cid[order], kind="stable")]
+    same_card = cid[order[1:]] == cid[order[:-1]]
+    prev_time[order[1:][same_card]] = time_ms[order[:-1][same_card]]
+    diff = time_ms - prev_time
+    has_prev = prev_time != 0
+    gain[has_prev & (diff < -500)] += 2
+    slower = has_prev & (diff > 500)
+    gain[slower] = np.maximum(gain[slower] - 2, 0)
+
+    xp = int(np.trunc(gain[passed]).sum()) - int(base_xp[failed].sum()) * 2
+    if total_reviews > 5:
+        retention = passed.sum() / total_reviews
+        if retention >= 0.95: xp += 50
+        elif retention < 0.80: xp -= 50
+    return xp
+
+def calculate_hp(cols):
+    """HP ao fim das revisões: o dano nos erros não tem limite, a cura para em 100."""
+    if not cols.shape[1]: return 100
+    _, _, ease, _, factor, _, _, _, _ = cols
+    failed = ease == 1
+
+    damage = 15 + np.trunc((2600 - factor) / 100).astype(np.int64)
+    damage += np.where(_run_length(failed) >= 3, 25, 0)
+    delta = np.where(failed, -damage, np.where(ease >= 3, 2, 1))
+
+    # Perda acumulada (100 - hp); o teto de 100 só age nas curas, então a perda final
+    # é o acumulado total menos o menor acumulado visto no início ou após uma cura.
+    loss = np.concatenate(([0], np.cumsum(-delta)))
+    floors = np.concatenate(([True], ~failed))
+    return max(0, 100 - int(loss[-1] - loss[floors].min()))